@@ -0,0 +1,363 @@
+import os
+import argparse
+import operator
+from array import array
+
+import numpy as np
+
+import MemoryImage
+import Watchdog
+from TraceFormat import ARCH_DEFAULTS
+from FunctionalSimulator import IMEM_func, DMEM_func, Core_func, load_arch, DUMP_MODES, OPCODES, OPCODE_FORMATS, OP_HALT
+
+# Returned by a batch handler instead of executing when the members would stop
+# behaving identically: different branch outcomes or VLR values, or anything the
+# per-member interpreter reports as an error.
+DIVERGED = -2
+
+class Core_func_batch(object):
+    """
+    Functional core that runs one program over N independent data sets at
+    once. The register files and memories get a leading batch dimension and
+    every instruction is a single NumPy expression across the batch. Once the
+    members would behave differently, each member's state moves to its own
+    Core_func, which finishes the program from there.
+    No trace is recorded; the results are the registers and memories.
+    """
+    def __init__(self, imem, sdmems, vdmems, arch = None):
+        self.IMEM = imem
+        self.SDMEMs = sdmems
+        self.VDMEMs = vdmems
+        self.N = len(sdmems)
+        self.PC = 0
+        self.arch = dict(ARCH_DEFAULTS, **(arch or {}))
+        self.MVL = self.arch["MVL"]
+
+        self.SRF = np.zeros((self.N, self.arch["numScalarRegs"]), dtype=np.int64)
+        self.VRF = np.zeros((self.N, self.arch["numVectorRegs"], self.MVL), dtype=np.int64)
+        self.VMR = np.zeros((self.N, self.MVL), dtype=np.int64)
+        self.VLR = 0 # identical for all members while in lockstep
+        self.SD = np.stack([np.frombuffer(dmem.data, dtype=np.int32) for dmem in sdmems])
+        self.VD = np.stack([np.frombuffer(dmem.data, dtype=np.int32) for dmem in vdmems])
+        self.members = []        # one Core_func per data set after run()
+        self.diverged_at = None  # PC where the batch split up, if it did
+        self.watchdog = None     # Watchdog.Watchdog while budgets are set, see enable_watchdog()
+
+        # Instructions with register operands outside the register files are left to the interpreter
+        counts = {"S": self.arch["numScalarRegs"], "V": self.arch["numVectorRegs"]}
+        self.valid = [ins is not None and ins[0] < len(OPCODES) and
+                      all(0 <= op < counts[kind] for kind, op in zip(OPCODE_FORMATS[OPCODES[ins[0]]], ins[1]) if kind != "I")
+                      for ins in imem.program]
+        self.dispatch = [getattr(self, "execute_" + name, None) for name in OPCODES]
+
+    """
+    EXECUTE OPERATIONS:
+    Same arguments as the Core_func handlers. Returns 0 after executing the
+    instruction for every member, or DIVERGED without changing any state.
+    """
+
+    def active(self):
+        # Elements below VLR whose VMR bit is set, per member
+        return self.VMR[:, :self.VLR] == 1
+
+    def vector_op(self, vd, vs1, src2, op):
+        VLR = self.VLR
+        VR2 = self.VRF[:, vs1, :VLR]
+        if op is not self.truncating_divide:
+            # Core_func holds unbounded Python integers; leave results that may not fit in int64 to it
+            # bound on |result|: |a| + |b| for ADD and SUB, |a| * |b| for MUL
+            a, b = np.abs(VR2.astype(np.float64)), np.abs(np.asarray(src2).astype(np.float64))
+            bound = a * b if op is operator.mul else a + b
+            if bound.size and bound.max() >= pow(2, 62): return DIVERGED
+        result = op(VR2, src2)
+        np.copyto(self.VRF[:, vd, :VLR], result, where=self.active())
+        return 0
+
+    def truncating_divide(self, num, den):
+        # Same as int(num / den) element by element, with x / 0 giving 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quotient = np.trunc(num / np.where(den == 0, 1, den))
+        return np.where(den == 0, 0, quotient).astype(np.int64)
+
+    def execute_ADDVV(self, vd, vs1, vs2): return self.vector_op(vd, vs1, self.VRF[:, vs2, :self.VLR], operator.add)
+    def execute_SUBVV(self, vd, vs1, vs2): return self.vector_op(vd, vs1, self.VRF[:, vs2, :self.VLR], operator.sub)
+    def execute_MULVV(self, vd, vs1, vs2): return self.vector_op(vd, vs1, self.VRF[:, vs2, :self.VLR], operator.mul)
+    def execute_DIVVV(self, vd, vs1, vs2): return self.vector_op(vd, vs1, self.VRF[:, vs2, :self.VLR], self.truncating_divide)
+    def execute_ADDVS(self, vd, vs1, ss):  return self.vector_op(vd, vs1, self.SRF[:, ss, None], operator.add)
+    def execute_SUBVS(self, vd, vs1, ss):  return self.vector_op(vd, vs1, self.SRF[:, ss, None], operator.sub)
+    def execute_MULVS(self, vd, vs1, ss):  return self.vector_op(vd, vs1, self.SRF[:, ss, None], operator.mul)
+
+    def execute_DIVVS(self, vd, vs1, ss):
+        if ((self.SRF[:, ss] == 0) & self.active().any(axis=1)).any(): return DIVERGED # divide by zero error
+        return self.vector_op(vd, vs1, self.SRF[:, ss, None], self.truncating_divide)
+
+    # Vector Mask Register Operations
+
+    def compare(self, vs1, src2, cond):
+        # Elements past VLR are set to one, as in Core_func.set_mask
+        mask = np.ones((self.N, self.MVL), dtype=np.int64)
+        mask[:, :self.VLR] = cond(self.VRF[:, vs1, :self.VLR], src2)
+        self.VMR[:] = mask
+        return 0
+
+    def execute_SEQVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.eq)
+    def execute_SNEVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.ne)
+    def execute_SGTVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.gt)
+    def execute_SLTVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.lt)
+    def execute_SGEVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.ge)
+    def execute_SLEVV(self, vs1, vs2): return self.compare(vs1, self.VRF[:, vs2, :self.VLR], operator.le)
+
+    def execute_SEQVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.eq)
+    def execute_SNEVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.ne)
+    def execute_SGTVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.gt)
+    def execute_SLTVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.lt)
+    def execute_SGEVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.ge)
+    def execute_SLEVS(self, vs1, ss): return self.compare(vs1, self.SRF[:, ss, None], operator.le)
+
+    def execute_CVM(self):
+        self.VMR[:] = 1
+        return 0
+
+    def execute_ROI_BEGIN(self): return 0 # nothing is traced in a batch
+    def execute_ROI_END(self): return 0
+
+    def execute_POP(self, sd):
+        self.SRF[:, sd] = (self.VMR == 1).sum(axis=1)
+        return 0
+
+    # Vector Length Register Operations
+
+    def execute_MTCL(self, ss):
+        SR1 = self.SRF[:, ss]
+        if (SR1 != SR1[0]).any() or not 0 < SR1[0] <= self.MVL: return DIVERGED
+        self.VLR = int(SR1[0])
+        return 0
+
+    def execute_MFCL(self, sd):
+        self.SRF[:, sd] = self.VLR
+        return 0
+
+    # Memory Access Operations
+
+    def in_bounds(self, mem, addrs):
+        # Negative addresses wrap around to the top of memory, as in DMEM_func
+        return addrs.size == 0 or (addrs.min() >= -mem.shape[1] and addrs.max() < mem.shape[1])
+
+    def vector_load(self, vd, addrs):
+        # addrs : (N, VLR) element addresses; only the active ones are accessed
+        active = self.active()
+        if not self.in_bounds(self.VD, addrs[active]): return DIVERGED
+        rows = np.arange(self.N)[:, None]
+        np.copyto(self.VRF[:, vd, :self.VLR], self.VD[rows, np.where(active, addrs, 0)], where=active)
+        return 0
+
+    def vector_store(self, vs, addrs):
+        active = self.active()
+        if not self.in_bounds(self.VD, addrs[active]): return DIVERGED
+        rows = np.broadcast_to(np.arange(self.N)[:, None], addrs.shape)[active]
+        cols = addrs[active] % self.VD.shape[1]
+        vals = self.VRF[:, vs, :self.VLR][active].astype(np.int32)
+
+        if len(np.unique(rows * self.VD.shape[1] + cols)) == len(cols):
+            self.VD[rows, cols] = vals
+        else:
+            # Repeated addresses: store element by element so the last one wins
+            for row, col, val in zip(rows, cols, vals): self.VD[row, col] = val
+        return 0
+
+    def lanes(self): return np.arange(self.VLR, dtype=np.int64)
+
+    def execute_LV(self, vd, ss):   return self.vector_load(vd, self.SRF[:, ss, None] + self.lanes())
+    def execute_SV(self, vs, ss):   return self.vector_store(vs, self.SRF[:, ss, None] + self.lanes())
+    def execute_LVWS(self, vd, ss, sstride): return self.vector_load(vd, self.SRF[:, ss, None] + self.lanes() * self.SRF[:, sstride, None])
+    def execute_SVWS(self, vs, ss, sstride): return self.vector_store(vs, self.SRF[:, ss, None] + self.lanes() * self.SRF[:, sstride, None])
+    def execute_LVI(self, vd, ss, vi): return self.vector_load(vd, self.SRF[:, ss, None] + self.VRF[:, vi, :self.VLR])
+    def execute_SVI(self, vs, ss, vi): return self.vector_store(vs, self.SRF[:, ss, None] + self.VRF[:, vi, :self.VLR])
+
+    def execute_LS(self, sd, ss, IMM):
+        addrs = self.SRF[:, ss] + IMM
+        if not self.in_bounds(self.SD, addrs): return DIVERGED
+        self.SRF[:, sd] = self.SD[np.arange(self.N), addrs]
+        return 0
+
+    def execute_SS(self, ss, sbase, IMM):
+        addrs = self.SRF[:, sbase] + IMM
+        if not self.in_bounds(self.SD, addrs): return DIVERGED
+        self.SD[np.arange(self.N), addrs] = self.SRF[:, ss].astype(np.int32)
+        return 0
+
+    # Scalar Operations
+
+    def scalar_op(self, sd, ss1, ss2, op):
+        # Through Python integers, as Core_func; results that do not fit in int64 are left to it
+        result = [op(int(a), int(b)) for a, b in zip(self.SRF[:, ss1], self.SRF[:, ss2])]
+        if min(result) < -pow(2, 63) or max(result) >= pow(2, 63): return DIVERGED
+        self.SRF[:, sd] = result
+        return 0
+
+    def shift_op(self, sd, ss1, ss2, op):
+        # Shifts go through Python integers so large shift amounts behave as in Core_func
+        if (self.SRF[:, ss2] < 0).any(): return DIVERGED # invalid input for shifting
+        result = [op(int(a), int(b)) for a, b in zip(self.SRF[:, ss1], self.SRF[:, ss2])]
+        if min(result) < -pow(2, 63) or max(result) >= pow(2, 63): return DIVERGED
+        self.SRF[:, sd] = result
+        return 0
+
+    def execute_ADD(self, sd, ss1, ss2): return self.scalar_op(sd, ss1, ss2, operator.add)
+    def execute_SUB(self, sd, ss1, ss2): return self.scalar_op(sd, ss1, ss2, operator.sub)
+    def execute_AND(self, sd, ss1, ss2): return self.scalar_op(sd, ss1, ss2, operator.and_)
+    def execute_OR(self, sd, ss1, ss2):  return self.scalar_op(sd, ss1, ss2, operator.or_)
+    def execute_XOR(self, sd, ss1, ss2): return self.scalar_op(sd, ss1, ss2, operator.xor)
+
+    def execute_SLL(self, sd, ss1, ss2): return self.shift_op(sd, ss1, ss2, operator.lshift)
+    def execute_SRL(self, sd, ss1, ss2): return self.shift_op(sd, ss1, ss2, lambda a, b: (a % 0x100000000) >> b)
+    def execute_SRA(self, sd, ss1, ss2): return self.shift_op(sd, ss1, ss2, operator.rshift)
+
+    def branch(self, ss1, ss2, IMM, cond):
+        if IMM > pow(2, 20) or IMM < -pow(2, 20): return DIVERGED # invalid immediate
+        taken = cond(self.SRF[:, ss1], self.SRF[:, ss2])
+        if (taken != taken[0]).any(): return DIVERGED
+        if taken[0]:
+            if self.PC + IMM < 0: return DIVERGED # target outside the program
+            self.PC += IMM - 1
+        return 0
+
+    def execute_BEQ(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.eq)
+    def execute_BNE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.ne)
+    def execute_BGT(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.gt)
+    def execute_BLT(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.lt)
+    def execute_BGE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.ge)
+    def execute_BLE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.le)
+
+    # Register - Register shuffle
+    # The element loops of Core_func, one batch column at a time, so a destination
+    # that is also a source sees the same partial updates
+
+    def execute_UNPACKLO(self, vd, vs1, vs2):
+        VR1, VR2, VR3 = self.VRF[:, vd], self.VRF[:, vs1], self.VRF[:, vs2]
+        for i in range(0, self.VLR, 2):
+            VR1[:, i] = VR2[:, i//2]
+            VR1[:, i+1] = VR3[:, i//2]
+        return 0
+
+    def execute_UNPACKHI(self, vd, vs1, vs2):
+        VR1, VR2, VR3, VLR = self.VRF[:, vd], self.VRF[:, vs1], self.VRF[:, vs2], self.VLR
+        for i in range(0, VLR, 2):
+            VR1[:, i] = VR2[:, (VLR + i)//2]
+            VR1[:, i+1] = VR3[:, (VLR + i)//2]
+        return 0
+
+    def execute_PACKLO(self, vd, vs1, vs2):
+        VR1, VR2, VR3, VLR = self.VRF[:, vd], self.VRF[:, vs1], self.VRF[:, vs2], self.VLR
+        for i in range(0, VLR, 2):
+            VR1[:, i//2] = VR2[:, i]
+            VR1[:, (VLR + i)//2] = VR3[:, i]
+        return 0
+
+    def execute_PACKHI(self, vd, vs1, vs2):
+        VR1, VR2, VR3, VLR = self.VRF[:, vd], self.VRF[:, vs1], self.VRF[:, vs2], self.VLR
+        for i in range(0, VLR, 2):
+            VR1[:, i//2] = VR2[:, i+1]
+            VR1[:, (VLR + i)//2] = VR3[:, i+1]
+        return 0
+
+    def split(self):
+        # Hand the state of every member to its own Core_func
+        self.members = []
+        for m in range(self.N):
+            core = Core_func(self.IMEM, self.SDMEMs[m], self.VDMEMs[m], self.arch)
+            core.set_trace_level("none")
+            core.SRF.registers = [[int(val)] for val in self.SRF[m]]
+            core.VRF.registers = [[int(val) for val in row] for row in self.VRF[m]]
+            core.VMR.Write(0, [int(val) for val in self.VMR[m]])
+            core.VLR.registers = [[self.VLR]]
+            self.SDMEMs[m].replace(MemoryImage.nonzero_pages(array('i', self.SD[m].tobytes())))
+            self.VDMEMs[m].replace(MemoryImage.nonzero_pages(array('i', self.VD[m].tobytes())))
+            core.PC = self.PC
+            self.members.append(core)
+
+    def enable_watchdog(self, max_instructions = None, max_seconds = None, interval = None):
+        # Same budgets as Core_func.enable_watchdog(), for every member: the
+        # instructions run in lockstep count against each of them
+        self.watchdog = Watchdog.Watchdog("Batch", max_instructions, None, max_seconds, interval)
+
+    def run(self, PC = 0): # THIS IS OUR MAIN FUNCTION
+        """
+        Function to run the program for the whole batch
+        Returns : list of Core_func, one per data set, holding the final state
+        """
+        self.PC = PC
+        program = self.IMEM.program
+        dispatch = self.dispatch
+        watchdog = self.watchdog
+        executed = 0
+        due = -1
+        if watchdog is not None:
+            watchdog.start()
+            due = watchdog.next_check(executed)
+        try:
+            while(True):
+                ins = program[self.PC]
+
+                if ins is not None:
+                    if executed == due:
+                        if watchdog.check(executed): break
+                        due = watchdog.next_check(executed)
+                    opcode, operands = ins
+                    if opcode == OP_HALT: break
+                    if not self.valid[self.PC] or dispatch[opcode](*operands) == DIVERGED:
+                        self.diverged_at = self.PC
+                        break
+                    executed += 1
+
+                self.PC = self.PC + 1
+        except IndexError:
+            # Ran off the end of the program; every member reports it
+            self.diverged_at = self.PC
+
+        self.split()
+        if watchdog is not None: watchdog.finish(executed)
+        if self.diverged_at is not None:
+            print("Batch - members diverge at PC", self.PC, "; finishing them one by one")
+            for m, core in enumerate(self.members):
+                if watchdog is not None:
+                    remaining = None if watchdog.max_instructions is None else watchdog.max_instructions - executed
+                    core.watchdog = Watchdog.Watchdog("Batch member %d" % m, remaining, None, watchdog.max_seconds, watchdog.interval)
+                core.run(self.PC)
+        return self.members
+
+if __name__ == "__main__":
+    #parse arguments for input file location
+    parser = argparse.ArgumentParser(description='Run one program over many data sets at once')
+    parser.add_argument('--iodir', default="", type=str, help='Path to the folder containing Code.asm.')
+    parser.add_argument('--datasets', nargs='+', required=True, type=str, help='Folders with the SDMEM/VDMEM inputs of each data set; outputs are written next to them.')
+    parser.add_argument('--memformat', default="text", choices=["text", "binary", "sparse"], help='Format of the SDMEM/VDMEM input and output files.')
+    parser.add_argument('--dump', default="full", choices=DUMP_MODES, help='Write the whole data memories (full), every word of the pages the program wrote (modified) or only the words that changed (diff); modified and diff write address:value text files.')
+    parser.add_argument('--max-instructions', default=None, type=int, help='Stop every data set after executing this many instructions.')
+    parser.add_argument('--max-seconds', default=None, type=float, help='Stop the lockstep run, and each data set finished on its own, after this many seconds of wall time.')
+    parser.add_argument('--progress', default=None, type=float, help='Print the instructions executed and instructions/s every N seconds.')
+    args = parser.parse_args()
+
+    iodir = os.path.abspath(args.iodir)
+    print("IO Directory:", iodir)
+
+    # Parse IMEM
+    arch = load_arch(iodir)
+    imem = IMEM_func(iodir, arch)
+    if imem.errors: raise SystemExit(1)
+    datasets = [os.path.abspath(path) for path in args.datasets]
+    sdmems = [DMEM_func("SDMEM", path, 13, args.memformat) for path in datasets]
+    vdmems = [DMEM_func("VDMEM", path, 17, args.memformat) for path in datasets]
+
+    # Run the batch
+    batch = Core_func_batch(imem, sdmems, vdmems, arch)
+    if args.max_instructions is not None or args.max_seconds is not None or args.progress is not None:
+        batch.enable_watchdog(args.max_instructions, args.max_seconds, args.progress)
+    members = batch.run()
+
+    for path, core, sdmem, vdmem in zip(datasets, members, sdmems, vdmems):
+        core.dumpregs(path)
+        sdmem.dump(args.dump)
+        vdmem.dump(args.dump)
+
+    # THE END
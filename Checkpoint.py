@@ -0,0 +1,112 @@
+import sys
+import zlib
+import struct
+from array import array
+
+import MemoryImage
+
+# Architectural checkpoint of a functional core: PC, the number of dynamic
+# instructions executed so far (trace position), every register file and both
+# data memories.
+#
+# File layout (little-endian):
+#   header   : magic "VCKP", format version (u16), PC (i64), trace position (u64)
+#   sections : zlib compressed; SRF, VRF, VMR, VLR as register count and
+#              length (u32 each) followed by the registers as int64, then
+#              SDMEM and VDMEM as the word count (u64) and the number of non
+#              zero pages (u32), the page numbers (u32 each) and the int32
+#              words of those pages, and optionally a flags byte (bit 0:
+#              execution is inside the region of interest)
+# Version 1 files stored SDMEM and VDMEM as 1 and the word count (u32 each)
+# followed by every word; they can still be restored.
+
+MAGIC = b"VCKP"
+VERSION = 2
+READ_VERSIONS = [1, 2]
+HEADER = struct.Struct("<4sHqQ")
+SECTION = struct.Struct("<II")
+MEMORY = struct.Struct("<QI")
+FLAGS = struct.Struct("<B")
+REGISTER_FILES = ["SRF", "VRF", "VMR", "VLR"]
+
+def pack_words(body, typecode, words):
+    words = array(typecode, words)
+    if sys.byteorder == 'big': words.byteswap()
+    body += words.tobytes()
+
+def save(path, core, position):
+    body = bytearray()
+    for name in REGISTER_FILES:
+        rf = core.RFs[name]
+        body += SECTION.pack(rf.reg_count, rf.vec_length)
+        pack_words(body, 'q', [int(val) for row in rf.rows() for val in row])
+    for dmem in [core.SDMEM, core.VDMEM]:
+        pages = MemoryImage.nonzero_pages(dmem.data)
+        body += MEMORY.pack(dmem.size, len(pages))
+        pack_words(body, 'I', [number for number, page in pages])
+        for number, page in pages: pack_words(body, 'i', page)
+    body += FLAGS.pack(1 if core.in_roi else 0)
+
+    with open(path, 'wb') as opf:
+        opf.write(HEADER.pack(MAGIC, VERSION, core.PC, position))
+        opf.write(zlib.compress(bytes(body)))
+
+def load(path, core):
+    """
+    Function to restore the state saved by save() into core
+    The register files and memories must have the sizes they were saved with.
+    Returns : tuple : (PC, trace position)
+    """
+    with open(path, 'rb') as ipf:
+        data = ipf.read()
+
+    magic, version, PC, position = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in READ_VERSIONS:
+        raise ValueError("Not a version %s checkpoint: %s" % (" or ".join(map(str, READ_VERSIONS)), path))
+    body = zlib.decompress(data[HEADER.size:])
+
+    offset = 0
+    def words(typecode, count):
+        nonlocal offset
+        words = array(typecode)
+        words.frombytes(body[offset:offset + words.itemsize * count])
+        if sys.byteorder == 'big': words.byteswap()
+        offset += words.itemsize * count
+        return words
+
+    def section(typecode, count, length):
+        nonlocal offset
+        saved = SECTION.unpack_from(body, offset)
+        if saved != (count, length):
+            raise ValueError("Checkpoint holds %d x %d words where %d x %d are expected" % (saved + (count, length)))
+        offset += SECTION.size
+        return words(typecode, count * length)
+
+    def memory(size):
+        # Returns the non zero pages of a memory section as (page number, words)
+        nonlocal offset
+        if version == 1: return MemoryImage.nonzero_pages(section('i', 1, size))
+        saved, count = MEMORY.unpack_from(body, offset)
+        if saved != size:
+            raise ValueError("Checkpoint holds a memory of %d words where %d are expected" % (saved, size))
+        offset += MEMORY.size
+        numbers = words('I', count)
+        pages = []
+        for number in numbers:
+            pages.append((number, words('i', min(MemoryImage.PAGE_WORDS, size - (number << MemoryImage.PAGE_BITS)))))
+        return pages
+
+    # Decode everything before touching the core so a bad file leaves it unchanged
+    registers = [section('q', core.RFs[name].reg_count, core.RFs[name].vec_length) for name in REGISTER_FILES]
+    memories = [memory(dmem.size) for dmem in [core.SDMEM, core.VDMEM]]
+    flags = FLAGS.unpack_from(body, offset)[0] if offset < len(body) else 0
+
+    for name, words in zip(REGISTER_FILES, registers):
+        rf = core.RFs[name]
+        for idx in range(rf.reg_count):
+            rf.Write(idx, list(words[idx * rf.vec_length:(idx+1) * rf.vec_length]))
+    for dmem, pages in zip([core.SDMEM, core.VDMEM], memories): dmem.replace(pages)
+
+    if core.in_roi is not None: core.in_roi = bool(flags & 1)
+    core.PC = PC
+    return PC, position
@@ -0,0 +1,116 @@
+import os
+import json
+import operator
+
+from Profiler import VECTOR_OPS, MASKED_OPS
+
+# Performance counters of a functional simulator run, in the manner of a
+# hardware PMU: instructions retired per class, vector elements processed and
+# masked off, data memory words read and written, branch outcomes and how VLR
+# is distributed over the vector instructions. Only instructions that complete
+# are counted; one that fails (e.g. MTCL beyond MVL, an out of bounds LV) is not.
+
+CLASSES = {
+    "vector_arith": ["ADDVV", "SUBVV", "MULVV", "DIVVV", "ADDVS", "SUBVS", "MULVS", "DIVVS"],
+    "mask": ["SEQVV", "SNEVV", "SGTVV", "SLTVV", "SGEVV", "SLEVV",
+             "SEQVS", "SNEVS", "SGTVS", "SLTVS", "SGEVS", "SLEVS", "CVM", "POP"],
+    "memory": ["LV", "SV", "LVI", "SVI", "LVWS", "SVWS", "LS", "SS"],
+    "scalar": ["ADD", "SUB", "AND", "OR", "XOR", "SLL", "SRL", "SRA", "MTCL", "MFCL"],
+    "branch": ["BEQ", "BNE", "BGT", "BLT", "BGE", "BLE"],
+    "shuffle": ["UNPACKLO", "UNPACKHI", "PACKLO", "PACKHI"],
+    "other": [], # HALT, the ROI markers and malformed instructions
+}
+OPCODE_CLASSES = {name: cls for cls, names in CLASSES.items() for name in names}
+
+# (memory, 0 for reads or 1 for writes) of the data memory accesses; vector
+# accesses move one word per active element
+ACCESSES = {"LV": ("VDMEM", 0), "LVI": ("VDMEM", 0), "LVWS": ("VDMEM", 0),
+            "SV": ("VDMEM", 1), "SVI": ("VDMEM", 1), "SVWS": ("VDMEM", 1),
+            "LS": ("SDMEM", 0), "SS": ("SDMEM", 1)}
+BRANCHES = {"BEQ": operator.eq, "BNE": operator.ne, "BGT": operator.gt,
+            "BLT": operator.lt, "BGE": operator.ge, "BLE": operator.le}
+
+class Counters(object):
+    def __init__(self, program, opcodes, MVL):
+        # program : pre-decoded IMEM_func.program; opcodes : opcode names by id
+        self.MVL = MVL
+        self.reset()
+
+        # Everything count() needs to know about the instruction at each PC:
+        # (class, 0 scalar / 1 vector / 2 masked vector, memory access, branch)
+        self.events = []
+        for ins in program:
+            if ins is None:
+                self.events.append(None)
+                continue
+            name = opcodes[ins[0]] if ins[0] < len(opcodes) else "INVALID"
+            kind = 2 if name in MASKED_OPS else 1 if name in VECTOR_OPS else 0
+            branch = (BRANCHES[name], ins[1][0], ins[1][1]) if name in BRANCHES else None
+            self.events.append((OPCODE_CLASSES.get(name, "other"), kind, ACCESSES.get(name), branch))
+
+    def reset(self):
+        self.instructions = 0
+        self.classes = dict.fromkeys(CLASSES, 0)
+        self.active = 0 # vector elements processed
+        self.masked = 0 # vector elements below VLR skipped by the mask
+        self.words = {"VDMEM": [0, 0], "SDMEM": [0, 0]} # words read, written
+        self.taken = 0
+        self.not_taken = 0
+        self.vlr = {} # VLR: vector instructions executed with it
+
+    def count(self, core, pc):
+        # Called before the instruction at pc executes, while its VLR, VMR and
+        # branch operands are still those it reads. Nothing is added until
+        # retire(): an instruction that fails is not counted as retired.
+        cls, kind, access, branch = self.events[pc]
+        VLR = active = taken = None
+        if kind:
+            VLR = int(core.VLR.Read(0)[0])
+            active = core.active_elements(VLR) if kind == 2 else VLR
+        elif branch is not None:
+            cond, ss1, ss2 = branch
+            taken = cond(core.SRF.Read(ss1)[0], core.SRF.Read(ss2)[0])
+        self.pending = (cls, kind, access, VLR, active, taken)
+
+    def retire(self):
+        # Called once the instruction passed to count() has completed
+        cls, kind, access, VLR, active, taken = self.pending
+        self.instructions += 1
+        self.classes[cls] += 1
+        if kind:
+            self.vlr[VLR] = self.vlr.get(VLR, 0) + 1
+            if kind == 2: self.masked += VLR - active
+            self.active += active
+            if access is not None: self.words[access[0]][access[1]] += active
+        elif access is not None:
+            self.words[access[0]][access[1]] += 1
+        elif taken is not None:
+            if taken: self.taken += 1
+            else: self.not_taken += 1
+
+    def snapshot(self):
+        """
+        Function to read all counters at once
+        Returns : dict : counter name: value, plus the derived vector efficiency
+        """
+        vector = sum(self.vlr.values())
+        elements = self.active + self.masked
+        return {"instructions": self.instructions,
+                "classes": dict(self.classes),
+                "elements": {"active": self.active, "masked": self.masked},
+                "memory": {name: {"read": rw[0], "written": rw[1]} for name, rw in self.words.items()},
+                "branches": {"taken": self.taken, "not_taken": self.not_taken},
+                "vlr": {str(vlr): self.vlr[vlr] for vlr in sorted(self.vlr)},
+                "derived": {"avg_vlr": round(sum(vlr * n for vlr, n in self.vlr.items()) / vector, 2) if vector else None,
+                            "mask_density": round(self.active / elements, 4) if elements else None,
+                            "lane_utilization": round(self.active / (vector * self.MVL), 4) if vector else None}}
+
+    def dump(self, iodir):
+        # Write snapshot() to counters.json in iodir
+        path = os.path.abspath(os.path.join(iodir, "counters.json"))
+        try:
+            with open(path, 'w') as opf:
+                json.dump(self.snapshot(), opf, indent = 2)
+            print("Counters - Dumped performance counters into output file in path:", path)
+        except:
+            print("Counters - ERROR: Couldn't write counters file in path:", path)
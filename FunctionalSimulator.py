@@ -1,21 +1,157 @@
 import os
 import argparse
+import operator
+from array import array
+
+import Checkpoint
+import Counters
+import MemoryImage
+import Profiler
+import ProgramImage
+import TraceFormat
+import Watchdog
+from TraceFormat import TRACE_IDS
+
+try:
+    import numpy as np # Optional; only needed for the numpy engine
+except ImportError:
+    np = None
+
+# Operand formats for every opcode understood by the functional core.
+# V: vector register, S: scalar register, I: immediate
+OPCODE_FORMATS = {
+    "ADDVV": "VVV", "SUBVV": "VVV", "MULVV": "VVV", "DIVVV": "VVV",
+    "ADDVS": "VVS", "SUBVS": "VVS", "MULVS": "VVS", "DIVVS": "VVS",
+
+    "SEQVV": "VV", "SNEVV": "VV", "SGTVV": "VV", "SLTVV": "VV", "SGEVV": "VV", "SLEVV": "VV",
+    "SEQVS": "VS", "SNEVS": "VS", "SGTVS": "VS", "SLTVS": "VS", "SGEVS": "VS", "SLEVS": "VS",
+    "CVM": "", "POP": "S",
+
+    "MTCL": "S", "MFCL": "S",
+
+    "LV": "VS", "SV": "VS", "LVI": "VSV", "SVI": "VSV", "LVWS": "VSS", "SVWS": "VSS",
+    "LS": "SSI", "SS": "SSI",
+
+    "ADD": "SSS", "SUB": "SSS", "AND": "SSS", "OR": "SSS",
+    "XOR": "SSS", "SLL": "SSS", "SRL": "SSS", "SRA": "SSS",
+
+    "BEQ": "SSI", "BNE": "SSI", "BGT": "SSI", "BLT": "SSI", "BGE": "SSI", "BLE": "SSI",
+
+    "UNPACKLO": "VVV", "UNPACKHI": "VVV", "PACKLO": "VVV", "PACKHI": "VVV",
+
+    # Pseudo-instructions delimiting the region of interest, the only part
+    # of the program that is traced when they are present
+    "ROI_BEGIN": "", "ROI_END": "",
+
+    "HALT": "",
+}
+OPCODES = list(OPCODE_FORMATS)
+OPCODE_IDS = {name: idx for idx, name in enumerate(OPCODES)}
+OP_HALT = OPCODE_IDS["HALT"]
+ROI_MARKERS = {OPCODE_IDS["ROI_BEGIN"], OPCODE_IDS["ROI_END"]}
+OP_INVALID = len(OPCODES) # Instructions whose operands could not be decoded
+
+# How much of the dynamic trace the core records. full: every instruction, as
+# the timing simulator needs; control: branches and HALT only; none: nothing.
+TRACE_LEVELS = ["none", "control", "full"]
+CONTROL_TRACE = {"B", "HALT"}
+
+# Data memories with more than 2^FLAT_ADDRESS_LEN words are paged by default.
+# Addresses travel through the trace as int32, which bounds the address width.
+FLAT_ADDRESS_LEN = 20
+MAX_ADDRESS_LEN = 31
+PAGE_BITS = MemoryImage.PAGE_BITS
+PAGE_WORDS = MemoryImage.PAGE_WORDS
+
+# What DMEM_func.dump writes: the whole memory, the pages the program wrote,
+# or only the words that differ from the input image
+DUMP_MODES = ["full", "modified", "diff"]
+
+def load_arch(iodir):
+    """
+    Function to read the architectural parameters (MVL and register counts, see
+    TraceFormat.ARCH_DEFAULTS) from Config.txt in iodir. Parameters the file
+    does not set, or a missing file, keep their default values.
+    Returns : dict : parameter name: value
+    """
+    arch = dict(TraceFormat.ARCH_DEFAULTS)
+    filepath = os.path.abspath(os.path.join(iodir, "Config.txt"))
+    if os.path.exists(filepath):
+        with open(filepath, 'r') as conf:
+            for line in conf.readlines():
+                if line.startswith('#') or '=' not in line: continue
+                name, value = line.split('=')[0].strip(), line.split('=')[1].split('#')[0].strip()
+                if name in arch: arch[name] = int(value)
+    TraceFormat.check_arch(arch)
+    return arch
 
 class IMEM_func(object):
-    def __init__(self, iodir):
+    def __init__(self, iodir, arch = None):
+        # arch : architectural parameters the register operands are checked
+        #        against, see load_arch(); the defaults when not given
         self.size = pow(2, 16) # Can hold a maximum of 2^16 instructions.
         self.filepath = os.path.abspath(os.path.join(iodir, "Code.asm"))
-        self.opfilepath = os.path.abspath(os.path.join(iodir, "trace.asm"))
+        self.imagepath = os.path.abspath(os.path.join(iodir, "Code.img"))
+        self.opfilepath = os.path.abspath(os.path.join(iodir, "trace.bin"))
+        self.textfilepath = os.path.abspath(os.path.join(iodir, "trace.asm"))
         self.instructions = []
+        self.program = []
         self.unrolled_instructions = []
+        self.errors = [] # (line index, message) for every malformed instruction
 
         try:
             with open(self.filepath, 'r') as insf:
-                self.instructions = [ins.strip() for ins in insf.readlines()]
+                lines = insf.readlines()
+            self.instructions = [ins.strip() for ins in lines]
             print("IMEM - Instructions loaded from file:", self.filepath)
             # print("IMEM - Instructions:", self.instructions)
         except:
             print("IMEM - ERROR: Couldn't open file in path:", self.filepath)
+            return
+
+        # Decode every line once so the core never touches the source text
+        # while running, or reuse the image a previous run cached for this source
+        arch = dict(TraceFormat.ARCH_DEFAULTS, **(arch or {}))
+        key = ProgramImage.key("".join(lines), arch, OPCODES)
+        self.program = ProgramImage.load(self.imagepath, key)
+        if self.program is not None:
+            print("IMEM - Program image loaded from file:", self.imagepath)
+            return
+
+        self.program = self.assemble(arch)
+        if self.errors: return
+        try:
+            ProgramImage.save(self.imagepath, key, self.program)
+        except OSError:
+            print("IMEM - WARNING: Couldn't cache the program image in path:", self.imagepath)
+
+    def assemble(self, arch):
+        """
+        Function to decode and validate every line of Code.asm, printing each
+        problem with its line number; malformed instructions are recorded in
+        self.errors, lines with an unknown opcode are ignored with a warning
+        Returns : list : pre-decoded record of every line, see decode()
+        """
+        program = []
+        for idx, line in enumerate(self.instructions):
+            ins, message = self.decode(self.removeComments(line.split()), arch)
+            if ins is not None and message is None and OPCODES[ins[0]] in ["BEQ", "BNE", "BGT", "BLT", "BGE", "BLE"]:
+                IMM = ins[1][2]
+                if IMM > pow(2, 20) or IMM < -pow(2, 20):
+                    message = "branch offset %d is outside +-2^20" % IMM
+                elif not 0 <= idx + IMM < len(self.instructions):
+                    message = "branch target %d is outside the program" % (idx + IMM)
+                if message is not None: ins = (OP_INVALID, ())
+
+            if message is None: pass
+            elif ins is None: print("IMEM - WARNING: %s:%d: %s" % (self.filepath, idx + 1, message))
+            else:
+                print("IMEM - ERROR: %s:%d: %s" % (self.filepath, idx + 1, message))
+                self.errors.append((idx, message))
+            program.append(ins)
+
+        if self.errors: print("IMEM - ERROR:", len(self.errors), "malformed instructions in file:", self.filepath)
+        return program
 
     def removeComments(self,l):
         i = 0
@@ -23,68 +159,232 @@ class IMEM_func(object):
             if "#" in l[i]: break
             else: i+=1
         return l[:i]
-    
+
+    def decode(self, instr_list, arch = TraceFormat.ARCH_DEFAULTS):
+        """
+        Function to convert an instruction in list format into a pre-decoded record
+        Args    : list  : instr_list : instruction with comments removed
+                  dict  : arch : register counts the register operands must fit
+        Returns : tuple : (record, message) : record is (opcode id, tuple of
+                          integer operands), None for blank lines and unknown
+                          opcodes, or (OP_INVALID, ()) for malformed operands;
+                          message says what is wrong with the line, else None
+        """
+        if not instr_list: return None, None
+        name = instr_list[0]
+        if name not in OPCODE_IDS: return None, "unknown opcode %s; line ignored" % name
+
+        fmt = OPCODE_FORMATS[name]
+        if len(instr_list) - 1 != len(fmt):
+            return (OP_INVALID, ()), "%s takes %d operands, found %d" % (name, len(fmt), len(instr_list) - 1)
+
+        counts = {"S": arch["numScalarRegs"], "V": arch["numVectorRegs"]}
+        operands = []
+        for pos, (kind, tok) in enumerate(zip(fmt, instr_list[1:])):
+            try:
+                if kind == "I":
+                    value = int(tok)
+                    if not -pow(2, 31) <= value < pow(2, 31): raise ValueError
+                else:
+                    value = int(tok[2:]) if tok[:2] == kind + "R" else -1
+                    if not 0 <= value < counts[kind]: raise ValueError
+            except ValueError:
+                expected = "a 32-bit integer" if kind == "I" else "one of %sR0 to %sR%d" % (kind, kind, counts[kind] - 1)
+                return (OP_INVALID, ()), "operand %d of %s is %s, expected %s" % (pos + 1, name, tok, expected)
+            operands.append(value)
+
+        return (OPCODE_IDS[name], tuple(operands)), None
+
     def Read(self, idx): # Use this to read from IMEM.
         if idx < self.size:
             #try:
             instr_list = self.instructions[idx].split()
             return self.removeComments(instr_list)
-            #except: 
+            #except:
             #    print("Error at index:",idx)
 
         else:
             print("IMEM - ERROR: Invalid memory access at index: ", idx, " with memory size: ", self.size)
 
-    def Dump(self):
+    def Dump(self, text = False, MVL = 64):
+        """
+        Function to write the dynamic trace as trace.bin, and also as the
+        human readable trace.asm when text is set
+        """
         try:
-            with open(self.opfilepath, 'w') as opf:
-                lines = [str(unroll_instr) + '\n' for unroll_instr in self.unrolled_instructions]
-                opf.writelines(lines)
+            TraceFormat.write_binary(self.opfilepath, self.unrolled_instructions, MVL)
             print("Dumped unrolled instructions into output file in path:", self.opfilepath)
         except:
             print("ERROR: Couldn't dump unrolled instructions output file in path:", self.opfilepath)
 
+        if not text: return
+        try:
+            TraceFormat.write_text(self.textfilepath, self.unrolled_instructions, MVL)
+            print("Dumped unrolled instructions into output file in path:", self.textfilepath)
+        except:
+            print("ERROR: Couldn't dump unrolled instructions output file in path:", self.textfilepath)
+
 class DMEM_func(object):
     # Word addressible - each address contains 32 bits.
-    def __init__(self, name, iodir, addressLen):
+    # Words are held in a contiguous int32 buffer rather than a list of Python ints,
+    # or for address spaces above 2^FLAT_ADDRESS_LEN words in lazily allocated pages.
+    def __init__(self, name, iodir, addressLen, memformat = "text", paged = None):
         self.name = name
         self.size = pow(2, addressLen)
         self.min_value  = -pow(2, 31)
         self.max_value  = pow(2, 31) - 1
-        self.ipfilepath = os.path.abspath(os.path.join(iodir, name + ".txt"))
-        self.opfilepath = os.path.abspath(os.path.join(iodir, name + "OP.txt"))
-        self.data = []
+        self.binary = memformat == "binary" # Binary images are name.bin / nameOP.bin
+        self.sparse = memformat == "sparse" # Sparse text files list address:value pairs
+        self.paged = addressLen > FLAT_ADDRESS_LEN if paged is None else paged
+        ext = ".bin" if self.binary else ".txt"
+        self.ipfilepath = os.path.abspath(os.path.join(iodir, name + ext))
+        self.opfilepath = os.path.abspath(os.path.join(iodir, name + "OP" + ext))
+        self.data = MemoryImage.PagedWords(self.size) if self.paged else array('i', bytes(4 * self.size))
+        self.dirty = {} # Written pages: page number -> the page's words before its first write
 
         try:
-            with open(self.ipfilepath, 'r') as ipf:
-                self.data = [int(line.strip()) for line in ipf.readlines()]
+            if self.binary:
+                if self.paged: self.data = MemoryImage.load_paged_image(self.ipfilepath, self.size)
+                else: self.data = MemoryImage.load_image(self.ipfilepath, self.size)
+            elif self.sparse:
+                for addr, word in MemoryImage.load_sparse(self.ipfilepath):
+                    if 0 <= addr < self.size: self.data[addr] = word
+                    else: print(self.name, "- ERROR: Address", addr, "of the input file is out of bounds; ignored")
+            else:
+                words = MemoryImage.load_text(self.ipfilepath)[:self.size]
+                self.data[:len(words)] = words
             print(self.name, "- Data loaded from file:", self.ipfilepath)
             # print(self.name, "- Data:", self.data)
-            self.data.extend([0x0 for i in range(self.size - len(self.data))])
         except:
             print(self.name, "- ERROR: Couldn't open input file in path:", self.ipfilepath)
 
-    def Read(self, idx): # Use this to read from DMEM.
-        if idx>self.size:
+    def in_bounds(self, lo, hi):
+        # Checks that every address in [lo, hi] exists. Negative addresses wrap
+        # around to the top of memory, as they index from the end of the buffer.
+        if lo < -self.size or hi >= self.size:
             print("Index out of bounds")
-            return
+            return False
+        return True
+
+    def Read(self, idx): # Use this to read from DMEM.
+        if not self.in_bounds(idx, idx): return
         return self.data[idx]
-        #pass # Replace this line with your code here.
 
     def Write(self, idx, val): # Use this to write into DMEM.
-        if idx > self.size:
-            print("Index out of bounds")
-            return
-        self.data[idx] = val
+        if not self.in_bounds(idx, idx): return
+        if (idx % self.size) >> PAGE_BITS not in self.dirty: self.mark([idx])
+        self.data[idx] = MemoryImage.to_words([val])[0]
         return
-        
-        pass # Replace this line with your code here.
 
-    def dump(self):
+    def Gather(self, addrs):
+        """
+        Function to read many words in one access
+        Args    : range or list : addrs : addresses to read; a range with a positive
+                                          step is read as a single slice
+        Returns : sequence of values, or None if any address is out of bounds
+        """
+        if len(addrs) == 0: return []
+        if isinstance(addrs, range) and addrs.step > 0 and addrs[0] >= 0:
+            if not self.in_bounds(addrs[0], addrs[-1]): return
+            return self.data[addrs.start:addrs[-1]+1:addrs.step]
+
+        if not self.in_bounds(min(addrs), max(addrs)): return
+        if len(addrs) == 1: return [self.data[addrs[0]]]
+        return operator.itemgetter(*addrs)(self.data)
+
+    def Scatter(self, addrs, vals):
+        """
+        Function to write many words in one access. When an address repeats the
+        last value written to it is kept.
+        Returns : 0 on success, -1 if any address is out of bounds
+        """
+        if len(addrs) == 0: return 0
+        if isinstance(addrs, range) and addrs.step > 0 and addrs[0] >= 0:
+            if not self.in_bounds(addrs[0], addrs[-1]): return -1
+            self.mark(addrs)
+            self.data[addrs.start:addrs[-1]+1:addrs.step] = MemoryImage.to_words(vals)
+            return 0
+
+        if not self.in_bounds(min(addrs), max(addrs)): return -1
+        self.mark(addrs)
+        data = self.data
+        for addr, val in zip(addrs, MemoryImage.to_words(vals)): data[addr] = val
+        return 0
+
+    def mark(self, addrs):
+        """
+        Function to record the pages about to be written, keeping a copy of
+        each page as it was before its first write
+        Args : range or list : addrs : bounds checked addresses that will be written
+        """
+        if isinstance(addrs, range) and 0 < addrs.step <= PAGE_WORDS and addrs[0] >= 0:
+            pages = range(addrs[0] >> PAGE_BITS, (addrs[-1] >> PAGE_BITS) + 1)
+        else:
+            size = self.size
+            pages = {(addr % size) >> PAGE_BITS for addr in addrs}
+        dirty = self.dirty
+        for number in pages:
+            if number not in dirty:
+                base = number << PAGE_BITS
+                dirty[number] = array('i', self.data[base:base + PAGE_WORDS])
+
+    def replace(self, pages):
+        """
+        Function to overwrite the whole memory; pages that end up different are marked as written
+        Args : list : pages : (page number, words) for every non zero page, as
+                              returned by MemoryImage.nonzero_pages
+        """
+        new = dict(pages)
+        for number in set(new) | {number for number, words in MemoryImage.nonzero_pages(self.data)}:
+            base = number << PAGE_BITS
+            old = self.data[base:base + PAGE_WORDS]
+            if new.get(number, array('i', bytes(4 * len(old)))) != array('i', old): self.mark(range(base, base + len(old)))
+
+        # in place, so views of the memory stay valid
+        if self.paged: self.data.clear()
+        else: self.data[:] = array('i', bytes(4 * self.size))
+        for number, words in pages:
+            base = number << PAGE_BITS
+            self.data[base:base + len(words)] = words
+
+    def written(self, diff = False):
+        """
+        Function to list the words of every written page
+        Args    : bool : diff : only the words that differ from the input image
+        Returns : list of (address, word) in address order
+        """
+        pairs = []
+        for number in sorted(self.dirty):
+            base = number << PAGE_BITS
+            words = self.data[base:base + PAGE_WORDS]
+            if diff: pairs += [(base + offset, word) for offset, (word, old) in enumerate(zip(words, self.dirty[number])) if word != old]
+            else: pairs += [(base + offset, word) for offset, word in enumerate(words)]
+        return pairs
+
+    def dump(self, mode = "full"):
+        """
+        Function to write the memory into nameOP
+        Args : str : mode : full       - every word, in the memory format
+                            modified   - every word of the written pages
+                            diff       - only the words that differ from the input image
+                            modified and diff are address:value text files
+        """
+        if mode != "full":
+            path = os.path.splitext(self.opfilepath)[0] + ".txt"
+            try:
+                MemoryImage.save_pairs(path, self.written(mode == "diff"))
+                print(self.name, "- Dumped", mode, "words into output file in path:", path)
+            except:
+                print(self.name, "- ERROR: Couldn't open output file in path:", path)
+            return
+
         try:
-            with open(self.opfilepath, 'w') as opf:
-                lines = [str(data) + '\n' for data in self.data]
-                opf.writelines(lines)
+            if self.binary:
+                MemoryImage.save_image(self.opfilepath, self.data)
+            elif self.sparse:
+                MemoryImage.save_sparse(self.opfilepath, self.data)
+            else:
+                MemoryImage.save_text(self.opfilepath, self.data)
             print(self.name, "- Dumped data into output file in path:", self.opfilepath)
         except:
             print(self.name, "- ERROR: Couldn't open output file in path:", self.opfilepath)
@@ -105,14 +405,14 @@ class RegisterFile_func(object):
         Args    : integer : idx : index of register
         Returns : list    : vector of values
         """
-        
+
         # will make easier to debug. Checks if accessing out of bounds
         if (idx >= len(self.registers)):
             print("Read Out of bounds")
             return -1
 
         item = self.registers[idx]
-        
+
         return item
         # pass # Replace this line with your code.
 
@@ -120,18 +420,18 @@ class RegisterFile_func(object):
 
         """
         Function to write a value to a register
-        Args: 
+        Args:
         1) integer                   : idx : index of register
         2) list of length vector_len : val : value to be added to the register
 
         """
 
-        
+
         # will make easier to debug. Checks if accessing out of bounds
         if (idx >= len(self.registers)):
             print("Write Out of bounds")
             return -1
-        
+
         # will make easier to debug. Checks if any element values greater than allowed
         """
         for element in val:
@@ -143,7 +443,7 @@ class RegisterFile_func(object):
         self.registers[idx] = val
 
         return 0
-        
+
         # pass # Replace this line with your code.
 
     def dump(self, iodir):  # DONT TOUCH
@@ -158,1205 +458,1409 @@ class RegisterFile_func(object):
         except:
             print(self.name, "- ERROR: Couldn't open output file in path:", opfilepath)
 
+    def rows(self):
+        # Registers as lists of element values, as saved in checkpoints
+        return self.registers
+
+class MaskRegister_func(RegisterFile_func):
+    # Same interface as RegisterFile_func, but each register is an integer bitmask
+    # with bit i set when element i is active. Write also takes a list of 0/1 values.
+    def __init__(self, name, count, length = 1, size = 32):
+        super().__init__(name, count, length, size)
+        self.full = (1 << self.vec_length) - 1 # every element active
+        self.registers = [0 for r in range(self.reg_count)]
+
+    def Write(self, idx, val):
+        if not isinstance(val, int): val = TraceFormat.mask_bits(val)
+        return super().Write(idx, val)
+
+    def rows(self):
+        return [[(bits >> i) & 1 for i in range(self.vec_length)] for bits in self.registers]
+
+    def dump(self, iodir):
+        # Same file as a register file holding one 0/1 value per element
+        expanded = RegisterFile_func(self.name, self.reg_count, self.vec_length, self.reg_bits)
+        expanded.registers = self.rows()
+        expanded.dump(iodir)
+
 class Core_func():
-    def __init__(self, imem, sdmem, vdmem):
+    def __init__(self, imem, sdmem, vdmem, arch = None):
+        # arch : architectural parameters, see load_arch(); defaults to 8 + 8 registers and MVL 64
         self.IMEM = imem
         self.SDMEM = sdmem
         self.VDMEM = vdmem
         self.PC = 0
+        self.arch = dict(TraceFormat.ARCH_DEFAULTS, **(arch or {}))
+        self.MVL = self.arch["MVL"]
 
-        self.RFs = {"SRF": RegisterFile_func("SRF", 8),      # 8 registers of 32 bit integers
-                    "VRF": RegisterFile_func("VRF", 8, 64),  # 8 registers of 64 elements; each of 32 bits
-                    "VMR": RegisterFile_func("VMR", 1, 64),
+        self.RFs = {"SRF": RegisterFile_func("SRF", self.arch["numScalarRegs"]),          # registers of 32 bit integers
+                    "VRF": RegisterFile_func("VRF", self.arch["numVectorRegs"], self.MVL), # registers of MVL elements; each of 32 bits
+                    "VMR": MaskRegister_func("VMR", 1, self.MVL),       # bitmask of MVL elements
                     "VLR": RegisterFile_func("VLR", 1)
-                }  
-        
-        # Your code here.returVV
-        
+                }
+        self.SRF = self.RFs["SRF"]
+        self.VRF = self.RFs["VRF"]
+        self.VMR = self.RFs["VMR"]
+        self.VLR = self.RFs["VLR"]
+        self.unrolled = self.IMEM.unrolled_instructions
+        self.trace_base = 0 # dynamic instructions executed before a restored checkpoint
+        self.profile = None # Profiler.Profile while profiling, see enable_profile()
+        self.watchdog = None # Watchdog.Watchdog while budgets are set, see enable_watchdog()
+        self.counters = None # Counters.Counters while counting, see enable_counters()
+        self.trace_level = "full" # level in use, see set_trace_level()
+        self.roi_level = "full"   # level chosen for the region of interest
+        # None without ROI markers in the program, else whether execution is inside the region
+        self.in_roi = None
+        if any(ins is not None and ins[0] == OPCODE_IDS["ROI_BEGIN"] for ins in self.IMEM.program):
+            self.in_roi = False
+
+        # Dispatch table indexed by opcode id; looked up by name so subclasses can override handlers
+        self.dispatch = [getattr(self, "execute_" + name) for name in OPCODES] + [self.execute_INVALID]
+        if self.in_roi is False: self.use_trace_level("none")
+
+    def trace(self, name, r0 = 0, r1 = 0, r2 = 0, vlr = 0, value = 0, payload = None):
+        # Appends the record of one executed instruction to the dynamic trace (see TraceFormat)
+        self.unrolled.append((TRACE_IDS[name], r0, r1, r2, vlr, value, payload))
+
+    def trace_memory(self, name, reg, VLR, VMR, addrs):
+        # Trace of a vector memory operation, with the address of every element
+        self.trace(name, reg, vlr = VLR, payload = self.address_list(VLR, VMR, addrs))
+
+    def trace_mask(self, name, vs1, s2, VLR, mask):
+        # Trace of a compare, with the new VMR as a bitmask
+        self.trace(name, vs1, s2, 0, VLR, payload = mask)
+
+    def trace_control(self, name, *args, **kwargs):
+        if name in CONTROL_TRACE: Core_func.trace(self, name, *args, **kwargs)
+
+    def skip_trace(self, *args, **kwargs):
+        return
+
+    def set_trace_level(self, level):
+        """
+        Function to choose how much of the dynamic trace is recorded (see
+        TRACE_LEVELS). Below full the trace functions are swapped for ones that
+        do nothing, so no trace records or payloads are built at all.
+        With ROI markers in the program the level applies inside the region
+        of interest only; nothing is traced outside it.
+        """
+        self.roi_level = level
+        self.use_trace_level("none" if self.in_roi is False else level)
+
+    def use_trace_level(self, level):
+        self.trace_level = level
+        for name in ["trace", "trace_memory", "trace_mask"]:
+            self.__dict__.pop(name, None)
+        if level == "control":
+            self.trace = self.trace_control
+            self.trace_memory = self.trace_mask = self.skip_trace
+        elif level == "none":
+            self.trace = self.trace_memory = self.trace_mask = self.skip_trace
+
     """
     EXECUTE OPERATIONS:
-    Args: self, instruction in a list format; 
-          0th element of list is the instruction name and subsequent elements  are operands
+    Args: self, integer operands of the pre-decoded instruction (register indices and immediates)
     Returns 0 if operation is successful, else returns -1
     """
 
-    def execute_ADDVV(self,instr_list): 
-        
+    def execute_ADDVV(self, vd, vs1, vs2):
+
         # Load Vector Registers into the functions
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("ADDVV", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        for i in range(VLR): 
-            if VMR[i] == 1: VR1[i] = VR2[i]+VR3[i]
-
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
 
-    def execute_SUBVV(self,instr_list):
-        try:
-            VR3 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR1 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
         for i in range(VLR):
-            if VMR[i] == 1:  VR3[i] = VR1[i]-VR2[i]
-
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR3)
-        
-        return 0
-
-    def execute_ADDVS(self,instr_list):
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        for i in range(VLR): 
-            if VMR[i] == 1: VR1[i] = VR2[i] + SR1
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
+            if VMR >> i & 1: VR1[i] = VR2[i]+VR3[i]
 
-    def execute_SUBVS(self,instr_list):
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        for i in range(VLR): 
-            if VMR[i] == 1: VR1[i] = VR2[i] - SR1
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
+        self.VRF.Write(vd, VR1)
 
-    def execute_MULVV(self,instr_list):
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        for i in range(VLR): 
-            if VMR[i] == 1: VR1[i] = VR2[i] * VR3[i]
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
         return 0
 
-    def execute_DIVVV(self,instr_list): 
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-
-        for i in range(VLR): 
-            if VMR[i] == 1: 
-                try:
-                    VR1[i] = int(VR2[i] / VR3[i])
-                except ZeroDivisionError as e: 
-                    VR1[i] = 0
-
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        return 0
-    
-    def execute_MULVS(self,instr_list):
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
- 
-        for i in range(VLR): 
-            if VMR[i] == 1: VR1[i] = VR2[i] * SR1
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
-    
-    def execute_DIVVS(self,instr_list):
+    def execute_SUBVV(self, vd, vs1, vs2):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR3 = self.VRF.Read(vd)
+            VR1 = self.VRF.Read(vs1)
+            VR2 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("SUBVV", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        try:
-            for i in range(VLR): 
-                if VMR[i] == 1: VR1[i] = int(VR2[i] / SR1)
-        except ZeroDivisionError as e: 
-            print("Divide by Zero error")
-            return -1
- 
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
 
-    # Vector Mask Register Operations
-    
-    def execute_SEQVV(self,instr_list):  
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
-            print("Error while loading values from register")
-            return -1
+        for i in range(VLR):
+            if VMR >> i & 1:  VR3[i] = VR1[i]-VR2[i]
 
-        mask = []
-        mask_str = " ("
+        self.VRF.Write(vd, VR3)
 
-        for i in range(VLR):
-            if VR1[i] == VR2[i]: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
         return 0
 
-    def execute_SNEVV(self,instr_list): 
+    def execute_ADDVS(self, vd, vs1, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("ADDVS", vd, vs1, ss, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
         for i in range(VLR):
-            if VR1[i] != VR2[i]: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0) 
-                mask_str = mask_str + "0,"
-        
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
-        return 0
-
-    def execute_SGTVV(self,instr_list): 
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
-            print("Error while loading values from register")
-            return -1  
-
-        mask = []
-        mask_str = " ("
+            if VMR >> i & 1: VR1[i] = VR2[i] + SR1
+        self.VRF.Write(vd, VR1)
 
-        for i in range(VLR):
-            if VR1[i] > VR2[i]: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0," 
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
         return 0
 
-    def execute_SLTVV(self,instr_list): 
+    def execute_SUBVS(self, vd, vs1, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("SUBVS", vd, vs1, ss, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
         for i in range(VLR):
-            if VR1[i] < VR2[i]:
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
+            if VMR >> i & 1: VR1[i] = VR2[i] - SR1
+        self.VRF.Write(vd, VR1)
+
         return 0
 
-    def execute_SGEVV(self,instr_list): 
+    def execute_MULVV(self, vd, vs1, vs2):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("MULVV", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
         for i in range(VLR):
-            if VR1[i] >= VR2[i]: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
+            if VMR >> i & 1: VR1[i] = VR2[i] * VR3[i]
+        self.VRF.Write(vd, VR1)
 
         return 0
 
-    def execute_SLEVV(self,instr_list): 
+    def execute_DIVVV(self, vd, vs1, vs2):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("DIVVV", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
         for i in range(VLR):
-            if VR1[i] <= VR2[i]:
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0," 
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVV"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
-        return 0
-
-    def execute_SEQVS(self,instr_list): 
-        try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
-            print("Error while loading values from register")
-            return -1
-
-        mask = []
-        mask_str = " ("
+            if VMR >> i & 1:
+                try:
+                    VR1[i] = int(VR2[i] / VR3[i])
+                except ZeroDivisionError as e:
+                    VR1[i] = 0
 
-        for i in range(VLR):
-            if VR1[i] == SR1: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
+        self.VRF.Write(vd, VR1)
         return 0
 
-    def execute_SNEVS(self,instr_list): 
+    def execute_MULVS(self, vd, vs1, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("MULVS", vd, vs1, ss, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
         for i in range(VLR):
-            if VR1[i] != SR1:
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
+            if VMR >> i & 1: VR1[i] = VR2[i] * SR1
+        self.VRF.Write(vd, VR1)
 
         return 0
 
-    def execute_SGTVS(self,instr_list): 
+    def execute_DIVVS(self, vd, vs1, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
+            self.trace("DIVVS", vd, vs1, ss, VLR)
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
-
-        for i in range(VLR):
-            if VR1[i] > SR1: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
-        return 0
-
-    def execute_SLTVS(self,instr_list): 
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
-            print("Error while loading values from register")
+            for i in range(VLR):
+                if VMR >> i & 1: VR1[i] = int(VR2[i] / SR1)
+        except ZeroDivisionError as e:
+            print("Divide by Zero error")
             return -1
 
-        mask = []
-        mask_str = " ("
+        self.VRF.Write(vd, VR1)
 
-        for i in range(VLR):
-            if VR1[i] < SR1: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
+        return 0
 
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
+    # Vector Mask Register Operations
 
+    def set_mask(self, mask, VLR, name, vs1, s2):
+        """
+        Function to write the result of a compare into the VMR, setting the
+        elements past VLR, and to trace it as an SVV/SVS instruction
+        Args: int : mask : bitmask of the elements below VLR that compared true
+        """
+        mask |= self.VMR.full >> VLR << VLR
+        self.VMR.Write(0, mask)
+        self.trace_mask(name, vs1, s2, VLR, mask)
         return 0
 
-    def execute_SGEVS(self,instr_list): 
+    def compare_VV(self, vs1, vs2, cond):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vs1)
+            VR2 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
+        mask = sum([1 << i for i in range(VLR) if cond(VR1[i], VR2[i])])
+        return self.set_mask(mask, VLR, "SVV", vs1, vs2)
 
-        for i in range(VLR):
-            if VR1[i] >= SR1: 
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
-        return 0
-    
-    def execute_SLEVS(self,instr_list): 
+    def compare_VS(self, vs1, ss, cond):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-        except: 
+            VR1 = self.VRF.Read(vs1)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+        except:
             print("Error while loading values from register")
             return -1
 
-        mask = []
-        mask_str = " ("
+        mask = sum([1 << i for i in range(VLR) if cond(VR1[i], SR1)])
+        return self.set_mask(mask, VLR, "SVS", vs1, ss)
 
-        for i in range(VLR):
-            if VR1[i] <= SR1:
-                mask.append(1)
-                mask_str = mask_str + "1,"
-            else: 
-                mask.append(0)
-                mask_str = mask_str + "0,"
-
-        pad_len = self.RFs["VMR"].vec_length - VLR
-        mask = mask + [1]*pad_len
-        self.RFs["VMR"].Write(0, mask)
-
-        mask_str = mask_str + "1,"*pad_len
-        mask_str = mask_str[:-1]+")"
-        self.IMEM.unrolled_instructions.append("SVS"+" "+instr_list[1]+" "+instr_list[2]+mask_str)
-        
-        return 0
+    def execute_SEQVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.eq)
+    def execute_SNEVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.ne)
+    def execute_SGTVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.gt)
+    def execute_SLTVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.lt)
+    def execute_SGEVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.ge)
+    def execute_SLEVV(self, vs1, vs2): return self.compare_VV(vs1, vs2, operator.le)
+
+    def execute_SEQVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.eq)
+    def execute_SNEVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.ne)
+    def execute_SGTVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.gt)
+    def execute_SLTVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.lt)
+    def execute_SGEVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.ge)
+    def execute_SLEVS(self, vs1, ss): return self.compare_VS(vs1, ss, operator.le)
 
-    def execute_CVM(self): 
+    def execute_CVM(self):
         try:
-            self.RFs["VMR"].Write(0, [1] * 64)
-            self.IMEM.unrolled_instructions.append("CVM")
+            self.VMR.Write(0, self.VMR.full)
+            self.trace("CVM")
             return 0
         except: return -1
-    
-    def execute_POP(self,instr_list): 
+
+    def execute_POP(self, sd):
         try:
-            SR1 = 0
-            VMR = self.RFs["VMR"].Read(0)
-            for i in range(len(VMR)):
-                if VMR[i] == 1: SR1 += 1
-            
-            self.RFs["SRF"].Write(int(instr_list[1][2:]), [SR1])
-            self.IMEM.unrolled_instructions.append("POP"+instr_list[1])
-            
+            SR1 = bin(self.VMR.Read(0)).count("1")
+            self.SRF.Write(sd, [SR1])
+            self.trace("POP", sd)
+
             return 0
         except: return -1
 
+    def active_elements(self, VLR):
+        # Number of elements below VLR whose VMR bit is set
+        return bin(self.VMR.Read(0) & ((1 << VLR) - 1)).count("1")
+
+    def mask_bits(self):
+        # The VMR as an integer bitmask, as traced
+        return self.VMR.Read(0)
+
     # Vector Length Register Operations
 
-    def execute_MTCL(self,instr_list):  
+    def execute_MTCL(self, ss):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
+            SR1 = self.SRF.Read(ss)[0]
         except: return -1
         if SR1<=0:
             print("VLR cannot be negative or zero")
             print("SR1:",SR1)
             return -1
-        
-        if SR1>64:
-            print("VLR cannot be greater than 64")
+
+        if SR1>self.MVL:
+            print("VLR cannot be greater than", self.MVL)
             print(SR1)
             return -1
-        
-        self.RFs["VLR"].Write(0, [SR1])
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1] + " ("+str(SR1)+")")
+
+        self.VLR.Write(0, [SR1])
+        self.trace("MTCL", ss, value = SR1)
         return 0
-    
-    def execute_MFCL(self,instr_list): 
+
+    def execute_MFCL(self, sd):
         try:
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.RFs["SRF"].Write(int(instr_list[1][2:]),[VLR])
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1] + " ("+str(VLR)+")")
+            VLR = self.VLR.Read(0)[0]
+            self.SRF.Write(sd, [VLR])
+            self.trace("MFCL", sd, value = VLR)
         except: return -1
 
     # Memory Access Operations
 
-    def execute_LV(self,instr_list): 
+    def address_list(self, VLR, VMR, addrs):
+        # Trace payload with the address of every element, -1 for masked off elements
+        if VMR & ((1 << VLR) - 1) == (1 << VLR) - 1: return array('i', addrs)
+        return array('i', [addrs[i] if VMR >> i & 1 else -1 for i in range(VLR)])
+
+    def stride_addresses(self, base, stride, VLR):
+        # A range lets VDMEM serve the whole access as a single slice
+        if stride == 0: return [base] * VLR
+        return range(base, base + stride * VLR, stride)
+
+    def indexed_addresses(self, base, index, VLR):
+        return [base + index[i] for i in range(VLR)]
+
+    def vector_load(self, name, vd, VR1, VLR, VMR, addrs):
+        """
+        Function to load the active elements of a vector register from VDMEM
+        Args: addrs : one address per element below VLR
+        """
+        if VMR & ((1 << VLR) - 1) == (1 << VLR) - 1:
+            vals = self.VDMEM.Gather(addrs)
+            if vals is None: return -1
+            VR1[:VLR] = vals
+        else:
+            active = [i for i in range(VLR) if VMR >> i & 1]
+            vals = self.VDMEM.Gather([addrs[i] for i in active])
+            if vals is None: return -1
+            for i, val in zip(active, vals): VR1[i] = val
+
+        self.VRF.Write(vd, VR1)
+        self.trace_memory(name, vd, VLR, VMR, addrs)
+        return 0
+
+    def vector_store(self, name, vs, VR1, VLR, VMR, addrs):
+        """
+        Function to store the active elements of a vector register into VDMEM
+        Args: addrs : one address per element below VLR
+        """
+        if VMR & ((1 << VLR) - 1) == (1 << VLR) - 1:
+            status = self.VDMEM.Scatter(addrs, VR1[:VLR])
+        else:
+            active = [i for i in range(VLR) if VMR >> i & 1]
+            status = self.VDMEM.Scatter([addrs[i] for i in active], [VR1[i] for i in active])
+        if status == -1: return -1
+
+        self.trace_memory(name, vs, VLR, VMR, addrs)
+        return 0
+
+    def execute_LV(self, vd, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vd)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
-        op_str = "("
-        for i in range(VLR): 
-            if VMR[i] == 1: 
-                VR1[i] = self.VDMEM.Read(SR1+i)
-                op_str += str(SR1+i)
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-        
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str)
-        return 0
 
-    def execute_SV(self,instr_list): 
+        return self.vector_load("LV", vd, VR1, VLR, VMR, self.stride_addresses(SR1, 1, VLR))
 
+    def execute_SV(self, vs, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vs)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
-        
-        op_str = "("       
-        for i in range(VLR):
-            if VMR[i] == 1: 
-                self.VDMEM.Write(SR1 + i, VR1[i])
-                op_str += str(SR1+i)
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str) 
-        return 0
 
-    def execute_LVI(self,instr_list): 
+        return self.vector_store("SV", vs, VR1, VLR, VMR, self.stride_addresses(SR1, 1, VLR))
+
+    def execute_LVI(self, vd, ss, vi):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vi)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
-        
-        op_str = "("
-        for i in range(VLR):
-            if VMR[i] == 1:
-                VR1[i] = self.VDMEM.Read(SR1 + VR2[i])
-                op_str += str(SR1 + VR2[i])
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-        
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str) 
-        
-        return 0
 
-    def execute_SVI(self,instr_list): 
+        return self.vector_load("LVI", vd, VR1, VLR, VMR, self.indexed_addresses(SR1, VR2, VLR))
+
+    def execute_SVI(self, vs, ss, vi):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vs)
+            VR2 = self.VRF.Read(vi)
+            SR1 = self.SRF.Read(ss)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
-        
-        op_str = "("
-        for i in range(VLR): 
-            if VMR[i] == 1: 
-                self.VDMEM.Write(SR1 + VR2[i], VR1[i])
-                op_str += str(SR1 + VR2[i])
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str) 
-        return 0
 
-    def execute_LVWS(self,instr_list): 
+        return self.vector_store("SVI", vs, VR1, VLR, VMR, self.indexed_addresses(SR1, VR2, VLR))
+
+    def execute_LVWS(self, vd, ss, sstride):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vd)
+            SR1 = self.SRF.Read(ss)[0]
+            SR2 = self.SRF.Read(sstride)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
-        
-        op_str = "("
-        for i in range(VLR):
-            if VMR[i] == 1:
-                VR1[i] = self.VDMEM.Read(SR1 + (SR2 * i))
-                op_str += str(SR1 + (SR2 * i))
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-        
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str) 
-        
-        return 0
 
-    def execute_SVWS(self,instr_list): 
+        return self.vector_load("LVWS", vd, VR1, VLR, VMR, self.stride_addresses(SR1, SR2, VLR))
+
+    def execute_SVWS(self, vs, ss, sstride):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            VLR = self.RFs["VLR"].Read(0)[0]
-            VMR = self.RFs["VMR"].Read(0)
+            VR1 = self.VRF.Read(vs)
+            SR1 = self.SRF.Read(ss)[0]
+            SR2 = self.SRF.Read(sstride)[0]
+            VLR = self.VLR.Read(0)[0]
+            VMR = self.VMR.Read(0)
         except:
             print("Error while loading values from register")
             return -1
 
-        op_str = "("
-        for i in range(VLR): 
-            if VMR[i] == 1:
-                self.VDMEM.Write(SR1 + (SR2 * i), VR1[i])
-                op_str += str(SR1 + (SR2 * i))
-                op_str +=","
-            else: op_str+="-1,"
-        op_str= op_str[:-1] + ")"
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+op_str) 
-        return 0
+        return self.vector_store("SVWS", vs, VR1, VLR, VMR, self.stride_addresses(SR1, SR2, VLR))
 
-    def execute_LS(self,instr_list): 
+    def execute_LS(self, sd, ss, IMM):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
+            SR1 = self.SRF.Read(ss)[0]
         except:
             print("Error while loading values from register")
             return -1
-        
+
         SR2 = self.SDMEM.Read(SR1+IMM)
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" ("+str(SR1+IMM)+")")
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR2])
+        self.trace("LS", sd, value = SR1+IMM)
+        self.SRF.Write(sd, [SR2])
         return 0
 
-    def execute_SS(self,instr_list): 
+    def execute_SS(self, ss, sbase, IMM):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            IMM = int(instr_list[3])
+            SR1 = self.SRF.Read(sbase)[0]
+            SR2 = self.SRF.Read(ss)[0]
         except:
             print("Error while loading values from register")
             return -1
 
         self.SDMEM.Write(SR1 + IMM, SR2)
-        self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" ("+str(SR1+IMM)+")")
+        self.trace("SS", ss, value = SR1+IMM)
         return
 
     # Scalar Operations
 
-    def execute_ADD(self,instr_list): 
+    def scalar_op(self, name, sd, ss1, ss2, op):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            SR1 = self.SRF.Read(ss1)[0]
+            SR2 = self.SRF.Read(ss2)[0]
+            self.trace(name, sd, ss1, ss2)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        SR3 = SR1 + SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
-        
+
+        SR3 = op(SR1, SR2)
+        self.SRF.Write(sd, [SR3])
+
         return 0
 
-    def execute_SUB(self,instr_list):
+    def shift_op(self, name, sd, ss1, ss2, op):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            SR1 = self.SRF.Read(ss1)[0]
+            SR2 = self.SRF.Read(ss2)[0]
+            self.trace(name, sd, ss1, ss2)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        SR3 = SR1 - SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
 
+        if SR2 <0:
+            print("invalid input for shifting")
+            return -1
+
+        SR3 = op(SR1, SR2)
+        self.SRF.Write(sd, [SR3])
         return 0
 
-    def execute_AND(self,instr_list):
+    def execute_ADD(self, sd, ss1, ss2): return self.scalar_op("ADD", sd, ss1, ss2, operator.add)
+    def execute_SUB(self, sd, ss1, ss2): return self.scalar_op("SUB", sd, ss1, ss2, operator.sub)
+    def execute_AND(self, sd, ss1, ss2): return self.scalar_op("AND", sd, ss1, ss2, operator.and_)
+    def execute_OR(self, sd, ss1, ss2):  return self.scalar_op("OR", sd, ss1, ss2, operator.or_)
+    def execute_XOR(self, sd, ss1, ss2): return self.scalar_op("XOR", sd, ss1, ss2, operator.xor)
+
+    def execute_SLL(self, sd, ss1, ss2): return self.shift_op("SLL", sd, ss1, ss2, operator.lshift)
+    def execute_SRL(self, sd, ss1, ss2): return self.shift_op("SRL", sd, ss1, ss2, lambda a, b: (a % 0x100000000) >> b)
+    def execute_SRA(self, sd, ss1, ss2): return self.shift_op("SRA", sd, ss1, ss2, operator.rshift)
+
+    def branch(self, ss1, ss2, IMM, cond):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            SR1 = self.SRF.Read(ss1)[0]
+            SR2 = self.SRF.Read(ss2)[0]
+        except:
             print("Error while loading values from register")
             return -1
-        
-        SR3 = SR1 & SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
 
-        return 0
-    
-    def execute_OR(self,instr_list):
-        try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
+        if IMM > pow(2, 20) or IMM < -pow(2, 20):
+            print("Invalid Immediate value")
             return -1
-        
-        SR3 = SR1 | SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
 
+        if cond(SR1, SR2):
+            if self.PC + IMM < 0:
+                print("Branch target", self.PC + IMM, "is outside the program")
+                return -1
+            self.PC += IMM -1
+
+        self.trace("B", value = self.PC + 1)
         return 0
 
-    def execute_XOR(self,instr_list):
+    def execute_BEQ(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.eq)
+    def execute_BNE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.ne)
+    def execute_BGT(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.gt)
+    def execute_BLT(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.lt)
+    def execute_BGE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.ge)
+    def execute_BLE(self, ss1, ss2, IMM): return self.branch(ss1, ss2, IMM, operator.le)
+
+    # Register - Register shuffle
+
+    def execute_UNPACKLO(self, vd, vs1, vs2):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            self.trace("UNPACKLO", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        SR3 = SR1 ^ SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
+
+        for i in range(0,VLR,2 ):
+            VR1[i] = VR2[int(i/2)]
+            VR1[i+1] = VR3[int(i/2)]
+
+        self.VRF.Write(vd, VR1)
 
         return 0
 
-    def execute_SLL(self,instr_list): 
+    def execute_UNPACKHI(self, vd, vs1, vs2):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            self.trace("UNPACKHI", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        if SR2 <0:
-            print("invalid input for shifting")
-            return -1
-        
-        SR3 = SR1 << SR2        
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
+
+        for i in range(0,VLR,2 ):
+            VR1[i] = VR2[int(VLR/2 + i/2)]
+            VR1[i+1] = VR3[int(VLR/2 + i/2)]
+
+        self.VRF.Write(vd, VR1)
+
         return 0
-    
-    def execute_SRL(self,instr_list): 
+
+    def execute_PACKLO(self, vd, vs1, vs2):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            self.trace("PACKLO", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        if SR2 <0:
-            print("invalid input for shifting")
-            return -1
-        
-        SR3 = (SR1 % 0x100000000) >> SR2
 
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
+        for i in range(0,VLR,2 ):
+            VR1[int(i/2)] = VR2[i]
+            VR1[int(VLR/2+i/2)] = VR3[i]
+
+        self.VRF.Write(vd, VR1)
         return 0
 
-    def execute_SRA(self,instr_list): 
+    def execute_PACKHI(self, vd, vs1, vs2):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[3][2:]))[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VR2 = self.VRF.Read(vs1)
+            VR3 = self.VRF.Read(vs2)
+            VLR = self.VLR.Read(0)[0]
+            self.trace("PACKHI", vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        if SR2 <0:
-            print("invalid input for shifting")
-            return -1
-        
-        SR3 = SR1 >> SR2
-        self.RFs["SRF"].Write(int(instr_list[1][2:]),[SR3])
 
+        for i in range(0,VLR,2 ):
+            VR1[int(i/2)] = VR2[i+1]
+            VR1[int(VLR/2+i/2)] = VR3[i+1]
+        self.VRF.Write(vd, VR1)
         return 0
 
-    def execute_BEQ(self,instr_list): 
-        try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
-            return -1
-        
-        if SR1 == SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
+    def execute_HALT(self):
+        # The timing simulator needs the HALT even when it comes after the region of interest
+        if self.in_roi is False and self.roi_level != "none": Core_func.trace(self, "HALT")
+        else: self.trace("HALT")
         return 0
 
-    def execute_BNE(self,instr_list):
-        try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
-            return -1
-        
-        if SR1 != SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
+    def execute_ROI_BEGIN(self):
+        self.in_roi = True
+        self.use_trace_level(self.roi_level)
+        VLR = self.VLR.Read(0)[0]
+        self.trace("ROI", vlr = VLR, payload = self.mask_bits())
         return 0
-        
-    def execute_BGT(self,instr_list): 
-        try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
-            return -1
-        
-        if SR1 > SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
+
+    def execute_ROI_END(self):
+        self.in_roi = False
+        self.use_trace_level("none")
         return 0
-        
-    def execute_BLT(self,instr_list): 
-        try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
+
+    def execute_INVALID(self, *instr_list):
+        print("Error while loading values from register")
+        return -1
+
+    def instruction_decode(self, ins):
+        """
+        Function to pass a pre-decoded instruction to its execute function
+        Inputs: ins : (opcode id, operands) record produced by IMEM_func.decode
+        """
+        opcode, operands = ins
+        ex_status = self.dispatch[opcode](*operands)
+
+        if ex_status == -1:
+            print("instruction:", self.IMEM.instructions[self.PC])
+            print("Error in executing statement")
             return -1
-        
-        if SR1 < SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
+
         return 0
-        
-    def execute_BGE(self,instr_list): 
+
+    def enable_profile(self):
+        # Count executions, VLR and active elements per PC on the following runs
+        self.profile = Profiler.Profile(self.IMEM.program, OPCODES)
+
+    def enable_counters(self):
+        # Count instruction classes, elements, memory words, branch outcomes and
+        # VLR on the following runs; read them with self.counters.snapshot()
+        self.counters = Counters.Counters(self.IMEM.program, OPCODES, self.MVL)
+
+    def enable_watchdog(self, max_instructions = None, max_seconds = None, interval = None):
+        # Stop the following runs after max_instructions instructions or
+        # max_seconds of wall time, and print the speed every interval seconds
+        self.watchdog = Watchdog.Watchdog("Functional", max_instructions, None, max_seconds, interval)
+
+    def outside_program(self):
+        """
+        Function to tell an IndexError raised by a run loop because the PC
+        left the program (a missing HALT) from any other one
+        Returns : True, after reporting it, if the PC is outside the program
+        """
+        if 0 <= self.PC < len(self.IMEM.program): return False
+        print("PC", self.PC, "is outside the program of", len(self.IMEM.program), "lines; is HALT missing?")
+        print("Failed Execution")
+        return True
+
+    def run(self, PC = 0, stop = None): # THIS IS OUR MAIN FUNCTION
+        # PC   : where to start, e.g. the PC of a restored checkpoint
+        # stop : return as soon as execution reaches this PC
+        if self.profile is not None or self.watchdog is not None or self.counters is not None:
+            if self.watchdog is not None: self.watchdog.start()
+            return self.run_watched(PC, stop)
+        self.PC = PC
+        program = self.IMEM.program
+        dispatch = self.dispatch
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
-            print("Error while loading values from register")
+            while(True):
+                if self.PC == stop: return
+                ins = program[self.PC]
+
+                if ins is not None:
+                    opcode, operands = ins
+                    if opcode == OP_HALT:
+                        self.execute_HALT()
+                        break
+                    if dispatch[opcode](*operands) == -1:
+                        print("instruction:", self.IMEM.instructions[self.PC])
+                        print("Error in executing statement")
+                        print("Failed Execution")
+                        break
+
+                self.PC = self.PC + 1
+        except IndexError:
+            if not self.outside_program(): raise
+
+    def run_watched(self, PC = 0, stop = None, executed = 0):
+        # run() with profiling, counters or the watchdog on; kept separate so
+        # the plain loop pays nothing when none of them is enabled
+        # executed : instructions the caller already ran in this run
+        self.PC = PC
+        program = self.IMEM.program
+        dispatch = self.dispatch
+        profile = self.profile
+        counters = self.counters
+        watchdog = self.watchdog
+        due = watchdog.next_check(executed) if watchdog is not None else -1
+        try:
+            while(True):
+                if self.PC == stop: break
+                ins = program[self.PC]
+
+                if ins is not None:
+                    if executed == due:
+                        if watchdog.check(executed): break
+                        due = watchdog.next_check(executed)
+                    if profile is not None: profile.count(self, self.PC)
+                    if counters is not None: counters.count(self, self.PC)
+                    executed += 1
+                    opcode, operands = ins
+                    if opcode == OP_HALT:
+                        self.execute_HALT()
+                        if counters is not None: counters.retire()
+                        break
+                    if dispatch[opcode](*operands) == -1:
+                        print("instruction:", self.IMEM.instructions[self.PC])
+                        print("Error in executing statement")
+                        print("Failed Execution")
+                        break
+                    if counters is not None: counters.retire()
+
+                self.PC = self.PC + 1
+        except IndexError:
+            if not self.outside_program(): raise
+        if watchdog is not None: watchdog.finish(executed)
+
+    def stream(self, PC = 0):
+        """
+        Function to execute the program like run(), handing out the dynamic
+        trace as it is produced instead of keeping all of it in IMEM
+        Returns : generator of trace records, ending after HALT, an error or
+                  when the watchdog stops the run
+        """
+        self.PC = PC
+        program = self.IMEM.program
+        dispatch = self.dispatch
+        profile = self.profile
+        counters = self.counters
+        watchdog = self.watchdog
+        executed = 0
+        due = -1
+        if watchdog is not None:
+            watchdog.start()
+            due = watchdog.next_check(executed)
+        self.unrolled = pending = []
+        try:
+            while(True):
+                ins = program[self.PC]
+
+                if ins is not None:
+                    if executed == due:
+                        if watchdog.check(executed): return
+                        due = watchdog.next_check(executed)
+                    if profile is not None: profile.count(self, self.PC)
+                    if counters is not None: counters.count(self, self.PC)
+                    executed += 1
+                    opcode, operands = ins
+                    if opcode == OP_HALT:
+                        self.execute_HALT()
+                        if counters is not None: counters.retire()
+                        yield from pending
+                        return
+                    if dispatch[opcode](*operands) == -1:
+                        print("instruction:", self.IMEM.instructions[self.PC])
+                        print("Error in executing statement")
+                        print("Failed Execution")
+                        return
+                    if counters is not None: counters.retire()
+                    if pending:
+                        yield from pending
+                        pending.clear()
+
+                self.PC = self.PC + 1
+        except IndexError:
+            if not self.outside_program(): raise
+        finally:
+            self.unrolled = self.IMEM.unrolled_instructions
+            if watchdog is not None: watchdog.finish(executed)
+
+
+    def dumpregs(self, iodir):
+        for rf in self.RFs.values():
+            rf.dump(iodir)
+
+    def checkpoint(self, path):
+        """
+        Function to save the architectural state (PC, registers, SDMEM, VDMEM)
+        and the trace position to a checkpoint file
+        Returns : 0 on success, else -1
+        """
+        try:
+            Checkpoint.save(path, self, self.trace_base + len(self.IMEM.unrolled_instructions))
+            print("Checkpoint at PC", self.PC, "saved to file:", path)
+            return 0
+        except (OSError, OverflowError) as e:
+            print("ERROR: Couldn't save checkpoint to file:", path, "-", e)
             return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
+
+    def restore(self, path):
+        """
+        Function to load a checkpoint written by checkpoint(); run(self.PC)
+        then resumes from the saved PC
+        Returns : 0 on success, else -1
+        """
+        try:
+            self.PC, self.trace_base = Checkpoint.load(path, self)
+            self.set_trace_level(self.roi_level) # the checkpoint may be inside or outside the region of interest
+            print("Checkpoint restored from file:", path, "at PC", self.PC, "after", self.trace_base, "instructions")
+            return 0
+        except (OSError, ValueError) as e:
+            print("ERROR: Couldn't restore checkpoint from file:", path, "-", e)
             return -1
-        
-        if SR1 >= SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
-        return 0
-        
-    def execute_BLE(self,instr_list): 
+
+
+    ## one method for each function
+
+class RegisterFile_func_np(RegisterFile_func):
+    # Same interface as RegisterFile_func, but each register is a row of a 2D NumPy array.
+    # Elements are held as int64 so products of 32 bit values never wrap, matching the list engine.
+    def __init__(self, name, count, length = 1, size = 32):
+        super().__init__(name, count, length, size)
+        self.registers = np.zeros((self.reg_count, self.vec_length), dtype=np.int64)
+
+class Core_func_np(Core_func):
+    """
+    Functional core that keeps the VRF and VMR in NumPy arrays and executes
+    each vector instruction as a single masked array expression.
+    Produces exactly the same registers, memories and trace as Core_func as
+    long as vector elements fit in int64; an arithmetic instruction whose
+    result would not is reported as an error rather than wrapped.
+    """
+    def __init__(self, imem, sdmem, vdmem, arch = None):
+        if np is None:
+            raise ImportError("The numpy engine requires NumPy to be installed")
+
+        self.shuffle_indices = {} # (instruction, VLR): (destination, source) index arrays
+        super().__init__(imem, sdmem, vdmem, arch)
+
+        self.RFs["VRF"] = self.VRF = RegisterFile_func_np("VRF", self.arch["numVectorRegs"], self.MVL)
+        self.RFs["VMR"] = self.VMR = RegisterFile_func_np("VMR", 1, self.MVL)
+        # Zero-copy view of a flat VDMEM; paged memories go through Gather/Scatter
+        self.vdmem_words = None if self.VDMEM.paged else np.frombuffer(self.VDMEM.data, dtype=np.int32)
+
+    def load_operands(self, vs1, vs2, scalar):
+        """
+        Function to fetch the active slices of both source operands and the mask
+        Returns : tuple : (VLR, source 1, source 2 or scalar value, boolean mask)
+        """
+        VLR = self.VLR.Read(0)[0]
+        VR2 = self.VRF.Read(vs1)[:VLR]
+        VR3 = self.SRF.Read(vs2)[0] if scalar else self.VRF.Read(vs2)[:VLR]
+        VMR = self.VMR.Read(0)[:VLR] == 1
+        return VLR, VR2, VR3, VMR
+
+    def vector_op(self, name, vd, vs1, vs2, scalar, op):
         try:
-            SR1 = self.RFs["SRF"].Read(int(instr_list[1][2:]))[0]
-            SR2 = self.RFs["SRF"].Read(int(instr_list[2][2:]))[0]
-            IMM = int(instr_list[3])
-        except: 
+            VR1 = self.VRF.Read(vd)
+            VLR, VR2, VR3, VMR = self.load_operands(vs1, vs2, scalar)
+            self.trace(name, vd, vs1, vs2, VLR)
+        except:
             print("Error while loading values from register")
             return -1
-        
-        if IMM > pow(2, 20) or IMM < -pow(2, 20):
-            print("Invalid Immediate value")
-            return -1
-        
-        if SR1 <= SR2:
-            self.PC += IMM -1
-        
-        self.IMEM.unrolled_instructions.append("B ("+str(self.PC + 1)+")")
+
+        if op is not self.truncating_divide:
+            # bound on |result|: |a| + |b| for ADD and SUB, |a| * |b| for MUL; past it check exactly
+            a = np.abs(VR2[VMR].astype(np.float64))
+            b = np.abs(np.asarray(VR3 if scalar else VR3[VMR], dtype=np.float64))
+            bound = a * b if op is operator.mul else a + b
+            if bound.size and bound.max() >= pow(2, 62):
+                pairs = zip(VR2[VMR].tolist(), [VR3] * len(a) if scalar else VR3[VMR].tolist())
+                if any(not -pow(2, 63) <= op(int(x), int(y)) < pow(2, 63) for x, y in pairs):
+                    print("Result out of the int64 range of the numpy engine, use --engine list")
+                    return -1
+
+        np.copyto(VR1[:VLR], op(VR2, VR3), where=VMR)
         return 0
 
-    # Register - Register shuffle
+    def execute_ADDVV(self, vd, vs1, vs2): return self.vector_op("ADDVV", vd, vs1, vs2, False, operator.add)
+    def execute_SUBVV(self, vd, vs1, vs2): return self.vector_op("SUBVV", vd, vs1, vs2, False, operator.sub)
+    def execute_MULVV(self, vd, vs1, vs2): return self.vector_op("MULVV", vd, vs1, vs2, False, operator.mul)
+    def execute_ADDVS(self, vd, vs1, ss):  return self.vector_op("ADDVS", vd, vs1, ss, True, operator.add)
+    def execute_SUBVS(self, vd, vs1, ss):  return self.vector_op("SUBVS", vd, vs1, ss, True, operator.sub)
+    def execute_MULVS(self, vd, vs1, ss):  return self.vector_op("MULVS", vd, vs1, ss, True, operator.mul)
 
-    def execute_UNPACKLO(self,instr_list): 
+    def truncating_divide(self, num, den):
+        # Same as int(num / den) element by element, with x / 0 giving 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quotient = np.trunc(num / np.where(den == 0, 1, den))
+        return np.where(den == 0, 0, quotient).astype(np.int64)
+
+    def execute_DIVVV(self, vd, vs1, vs2):
+        return self.vector_op("DIVVV", vd, vs1, vs2, False, self.truncating_divide)
+
+    def execute_DIVVS(self, vd, vs1, ss):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VLR, VR2, SR1, VMR = self.load_operands(vs1, ss, True)
+        except:
             print("Error while loading values from register")
             return -1
 
-        for i in range(0,VLR,2 ):
-            VR1[i] = VR2[int(i/2)]
-            VR1[i+1] = VR3[int(i/2)]
+        if SR1 == 0 and VMR.any():
+            self.trace("DIVVS", vd, vs1, ss, VLR)
+            print("Divide by Zero error")
+            return -1
+
+        return self.vector_op("DIVVS", vd, vs1, ss, True, self.truncating_divide)
 
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
+    # Vector Mask Register Operations
+
+    def set_mask(self, mask, VLR, name, vs1, s2):
+        VMR = self.VMR.Read(0)
+        VMR[:] = 1
+        VMR[:VLR] = mask
+        self.trace_mask(name, vs1, s2, VLR, VMR)
         return 0
-    
-    def execute_UNPACKHI(self,instr_list): 
+
+    def trace_mask(self, name, vs1, s2, VLR, mask):
+        bits = int.from_bytes(np.packbits(mask == 1, bitorder='little').tobytes(), 'little')
+        self.trace(name, vs1, s2, 0, VLR, payload = bits)
+
+    def execute_CVM(self):
+        try:
+            self.VMR.Read(0)[:] = 1
+            self.trace("CVM")
+            return 0
+        except: return -1
+
+    def compare_VV(self, vs1, vs2, cond):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VLR = self.VLR.Read(0)[0]
+            VR1 = self.VRF.Read(vs1)[:VLR]
+            VR2 = self.VRF.Read(vs2)[:VLR]
+        except:
             print("Error while loading values from register")
             return -1
 
-        for i in range(0,VLR,2 ):
-            VR1[i] = VR2[int(VLR/2 + i/2)]
-            VR1[i+1] = VR3[int(VLR/2 + i/2)]
+        return self.set_mask(cond(VR1, VR2), VLR, "SVV", vs1, vs2)
 
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        
-        return 0
-    
-    def execute_PACKLO(self,instr_list): 
+    def compare_VS(self, vs1, ss, cond):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
+            VLR = self.VLR.Read(0)[0]
+            VR1 = self.VRF.Read(vs1)[:VLR]
+            SR1 = self.SRF.Read(ss)[0]
+        except:
             print("Error while loading values from register")
             return -1
-        
-        for i in range(0,VLR,2 ):
-            VR1[int(i/2)] = VR2[i]
-            VR1[int(VLR/2+i/2)] = VR3[i]
 
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
-        return 0
+        return self.set_mask(cond(VR1, SR1), VLR, "SVS", vs1, ss)
 
-    def execute_PACKHI(self,instr_list): 
+    def execute_POP(self, sd):
         try:
-            VR1 = self.RFs["VRF"].Read(int(instr_list[1][2:]))
-            VR2 = self.RFs["VRF"].Read(int(instr_list[2][2:]))
-            VR3 = self.RFs["VRF"].Read(int(instr_list[3][2:]))
-            VLR = self.RFs["VLR"].Read(0)[0]
-            self.IMEM.unrolled_instructions.append(instr_list[0]+" "+instr_list[1]+" "+instr_list[2]+" "+instr_list[3])
-        except: 
-            print("Error while loading values from register")
-            return -1
+            SR1 = int(np.count_nonzero(self.VMR.Read(0) == 1))
+            self.SRF.Write(sd, [SR1])
+            self.trace("POP", sd)
+            return 0
+        except: return -1
 
-        for i in range(0,VLR,2 ):
-            VR1[int(i/2)] = VR2[i+1]
-            VR1[int(VLR/2+i/2)] = VR3[i+1]
-        self.RFs["VRF"].Write(int(instr_list[1][2:]),VR1)
+    def active_elements(self, VLR):
+        return int(np.count_nonzero(self.VMR.Read(0)[:VLR] == 1))
+
+    def mask_bits(self):
+        return int.from_bytes(np.packbits(self.VMR.Read(0) == 1, bitorder='little').tobytes(), 'little')
+
+    # Memory Access Operations
+
+    def indexed_addresses(self, base, index, VLR):
+        return base + index[:VLR]
+
+    def address_list(self, VLR, VMR, addrs):
+        return array('i', np.where(VMR[:VLR] == 1, addrs, -1).astype(np.int32).tobytes())
+
+    def vector_load(self, name, vd, VR1, VLR, VMR, addrs):
+        active = VMR[:VLR] == 1
+        addrs = np.asarray(addrs, dtype=np.int64)
+        sel = addrs[active]
+        if sel.size and not self.VDMEM.in_bounds(int(sel.min()), int(sel.max())): return -1
+
+        if self.vdmem_words is None: VR1[:VLR][active] = self.VDMEM.Gather(sel.tolist())
+        else: VR1[:VLR][active] = self.vdmem_words[sel]
+        self.trace_memory(name, vd, VLR, VMR, addrs)
+        return 0
+
+    def vector_store(self, name, vs, VR1, VLR, VMR, addrs):
+        unique = isinstance(addrs, range)
+        active = VMR[:VLR] == 1
+        addrs = np.asarray(addrs, dtype=np.int64)
+        sel = addrs[active]
+        if sel.size:
+            lo, hi = int(sel.min()), int(sel.max())
+            if not self.VDMEM.in_bounds(lo, hi): return -1
+            vals = VR1[:VLR][active]
+            if self.vdmem_words is not None and (unique or np.unique(sel).size == sel.size):
+                # Most stores stay within one page
+                self.VDMEM.mark([lo] if lo >= 0 and lo >> PAGE_BITS == hi >> PAGE_BITS else sel.tolist())
+                self.vdmem_words[sel] = vals
+            else: # Paged memory, or repeated addresses: store in element order so the last write wins
+                self.VDMEM.Scatter(sel.tolist(), vals.tolist())
+
+        self.trace_memory(name, vs, VLR, VMR, addrs)
         return 0
 
+    # Register - Register shuffle
 
-    def instruction_decode(self,instr_list):
+    def shuffle_index(self, name, VLR):
         """
-        Function to decode the instruction and pass to subsequent execute function
-        Inputs: instr_list : instruction in a list format
+        Function to build the permutation used by a shuffle for a given VLR.
+        Replays the element order of the list engine, so the last write to a
+        destination element wins exactly as it does there.
+        Returns : tuple : (destination indices, source indices into the two
+                           source registers laid end to end)
         """
-        instr_type = instr_list[0]
-        ex_status = 0
-
-        if  instr_type == "ADDVV" : ex_status = self.execute_ADDVV(instr_list)
-        elif  instr_type == "SUBVV" : ex_status = self.execute_SUBVV(instr_list)
-        elif  instr_type == "ADDVS" : ex_status = self.execute_ADDVS(instr_list)
-        elif  instr_type == "SUBVS" : ex_status = self.execute_SUBVS(instr_list)
-        elif  instr_type == "MULVV" : ex_status = self.execute_MULVV(instr_list)
-        elif  instr_type == "DIVVV" : ex_status = self.execute_DIVVV(instr_list)
-        elif  instr_type == "MULVS" : ex_status = self.execute_MULVS(instr_list)
-        elif  instr_type == "DIVVS" : ex_status = self.execute_DIVVS(instr_list)
-
-        elif  instr_type == "SEQVV" : ex_status = self.execute_SEQVV(instr_list)
-        elif  instr_type == "SNEVV" : ex_status = self.execute_SNEVV(instr_list)
-        elif  instr_type == "SGTVV" : ex_status = self.execute_SGTVV(instr_list)
-        elif  instr_type == "SLTVV" : ex_status = self.execute_SLTVV(instr_list)
-        elif  instr_type == "SGEVV" : ex_status = self.execute_SGEVV(instr_list)
-        elif  instr_type == "SLEVV" : ex_status = self.execute_SLEVV(instr_list)
-
-        elif  instr_type == "SEQVS" : ex_status = self.execute_SEQVS(instr_list)
-        elif  instr_type == "SNEVS" : ex_status = self.execute_SNEVS(instr_list)
-        elif  instr_type == "SGTVS" : ex_status = self.execute_SGTVS(instr_list)
-        elif  instr_type == "SLTVS" : ex_status = self.execute_SLTVS(instr_list)
-        elif  instr_type == "SGEVS" : ex_status = self.execute_SGEVS(instr_list)
-        elif  instr_type == "SLEVS" : ex_status = self.execute_SLEVS(instr_list)
-
-        elif  instr_type == "CVM" : ex_status = self.execute_CVM()
-        elif  instr_type == "POP" : ex_status = self.execute_POP(instr_list)
-
-        elif  instr_type == "MTCL" : ex_status = self.execute_MTCL(instr_list)
-        elif  instr_type == "MFCL" : ex_status = self.execute_MFCL(instr_list)
-
-        elif  instr_type == "LV" : ex_status = self.execute_LV(instr_list)
-        elif  instr_type == "SV" : ex_status = self.execute_SV(instr_list)
-        elif  instr_type == "LVI" : ex_status = self.execute_LVI(instr_list)
-        elif  instr_type == "SVI" : ex_status = self.execute_SVI(instr_list)
-        elif  instr_type == "LVWS" : ex_status = self.execute_LVWS(instr_list)
-        elif  instr_type == "SVWS" : ex_status = self.execute_SVWS(instr_list)
-        elif  instr_type == "LS" : ex_status = self.execute_LS(instr_list)
-        elif  instr_type == "SS" : ex_status = self.execute_SS(instr_list)
-
-        elif  instr_type == "ADD" : ex_status = self.execute_ADD(instr_list)
-        elif  instr_type == "SUB" : ex_status = self.execute_SUB(instr_list)
-        elif  instr_type == "AND" : ex_status = self.execute_AND(instr_list)
-        elif  instr_type == "OR" : ex_status = self.execute_OR(instr_list)
-        elif  instr_type == "XOR" : ex_status = self.execute_XOR(instr_list)
-        elif  instr_type == "SLL" : ex_status = self.execute_SLL(instr_list)
-        elif  instr_type == "SRL" : ex_status = self.execute_SRL(instr_list)
-        elif  instr_type == "SRA" : ex_status = self.execute_SRA(instr_list)
-
-        elif  instr_type == "BEQ" : ex_status = self.execute_BEQ(instr_list)
-        elif  instr_type == "BNE" : ex_status = self.execute_BNE(instr_list)
-        elif  instr_type == "BGT" : ex_status = self.execute_BGT(instr_list)
-        elif  instr_type == "BLT" : ex_status = self.execute_BLT(instr_list)
-        elif  instr_type == "BGE" : ex_status = self.execute_BGE(instr_list)
-        elif  instr_type == "BLE" : ex_status = self.execute_BLE(instr_list)
-
-        elif  instr_type == "UNPACKLO" : ex_status = self.execute_UNPACKLO(instr_list)
-        elif  instr_type == "UNPACKHI" : ex_status = self.execute_UNPACKHI(instr_list)
-        elif  instr_type == "PACKLO" : ex_status = self.execute_PACKLO(instr_list)
-        elif  instr_type == "PACKHI" : ex_status = self.execute_PACKHI(instr_list)
+        key = (name, VLR)
+        if key not in self.shuffle_indices:
+            hi = self.VRF.vec_length # Offset of the second source register
+            moves = {}
+            for i in range(0, VLR, 2):
+                if name == "UNPACKLO":
+                    moves[i], moves[i+1] = int(i/2), hi + int(i/2)
+                elif name == "UNPACKHI":
+                    moves[i], moves[i+1] = int(VLR/2 + i/2), hi + int(VLR/2 + i/2)
+                elif name == "PACKLO":
+                    moves[int(i/2)], moves[int(VLR/2+i/2)] = i, hi + i
+                elif name == "PACKHI":
+                    moves[int(i/2)], moves[int(VLR/2+i/2)] = i+1, hi + i+1
+            self.shuffle_indices[key] = (np.array(list(moves.keys()), dtype=np.intp),
+                                         np.array(list(moves.values()), dtype=np.intp))
+        return self.shuffle_indices[key]
+
+    def shuffle(self, name, vd, vs1, vs2):
+        # A destination that is also a source sees its own partial writes in the
+        # element loop; keep that behaviour by running the list engine's version
+        if vd == vs1 or vd == vs2:
+            return getattr(Core_func, "execute_" + name)(self, vd, vs1, vs2)
 
-
-        if ex_status == -1:
-            print("instruction:",instr_list)
-            print("Error in executing statement")
+        try:
+            VR1 = self.VRF.Read(vd)
+            sources = np.concatenate((self.VRF.Read(vs1), self.VRF.Read(vs2)))
+            VLR = self.VLR.Read(0)[0]
+            self.trace(name, vd, vs1, vs2, VLR)
+        except:
+            print("Error while loading values from register")
             return -1
 
+        dst, src = self.shuffle_index(name, VLR)
+        VR1[dst] = sources[src]
         return 0
-     
-    def run(self): # THIS IS OUR MAIN FUNCTION
-        self.PC = 0
-        ex_status = 0
-        while(True):
-            # break # Replace this line with your code.
-            #read
-            instr_list = self.IMEM.Read(self.PC)
-
-            if instr_list:
-                if instr_list[0] == "HALT": 
-                    self.IMEM.unrolled_instructions.append("HALT")
-                    break
-                else: 
-                    ex_status = self.instruction_decode(instr_list)
-                    if ex_status == -1: 
-                        print("Failed Execution")
-                        break
 
-            self.PC = self.PC + 1
-            
+    def execute_UNPACKLO(self, vd, vs1, vs2): return self.shuffle("UNPACKLO", vd, vs1, vs2)
+    def execute_UNPACKHI(self, vd, vs1, vs2): return self.shuffle("UNPACKHI", vd, vs1, vs2)
+    def execute_PACKLO(self, vd, vs1, vs2):   return self.shuffle("PACKLO", vd, vs1, vs2)
+    def execute_PACKHI(self, vd, vs1, vs2):   return self.shuffle("PACKHI", vd, vs1, vs2)
+
+# Source templates for the block compiler. Each entry is (guard, body): the body
+# is the inlined form of the execute_ function, and runs only while the guard
+# holds; otherwise the generated code calls the real handler so error messages
+# and corner cases stay exactly those of the interpreter. Operands are pasted in
+# as constants {o0}..{o2}, {tid} is the trace opcode id.
+VECTOR_VV_TEMPLATE = """VL = VLR[0][0]; M = VMR[0]; D = VRF[{o0}]; A = VRF[{o1}]; B = VRF[{o2}]
+emit(({tid}, {o0}, {o1}, {o2}, VL, 0, None))
+if ~M & ((1 << VL) - 1):
+    for i in range(VL):
+        if M >> i & 1: D[i] = A[i] {sym} B[i]
+else:
+    D[:VL] = [a {sym} b for a, b in zip(A[:VL], B[:VL])]"""
+
+VECTOR_VS_TEMPLATE = """VL = VLR[0][0]; M = VMR[0]; D = VRF[{o0}]; A = VRF[{o1}]; S = SRF[{o2}][0]
+emit(({tid}, {o0}, {o1}, {o2}, VL, 0, None))
+if ~M & ((1 << VL) - 1):
+    for i in range(VL):
+        if M >> i & 1: D[i] = A[i] {sym} S
+else:
+    D[:VL] = [a {sym} S for a in A[:VL]]"""
+
+SCALAR_TEMPLATE = """emit(({tid}, {o0}, {o1}, {o2}, 0, 0, None))
+SRF[{o0}] = [SRF[{o1}][0] {sym} SRF[{o2}][0]]"""
+
+SHUFFLE_TEMPLATE = """VL = VLR[0][0]; D = VRF[{o0}]; A = VRF[{o1}]; B = VRF[{o2}]; H = VL // 2
+emit(({tid}, {o0}, {o1}, {o2}, VL, 0, None))
+{sym}"""
+
+BLOCK_TEMPLATES = {
+    "ADDVV": (None, VECTOR_VV_TEMPLATE, "+"),
+    "SUBVV": (None, VECTOR_VV_TEMPLATE, "-"),
+    "MULVV": (None, VECTOR_VV_TEMPLATE, "*"),
+    "ADDVS": (None, VECTOR_VS_TEMPLATE, "+"),
+    "SUBVS": (None, VECTOR_VS_TEMPLATE, "-"),
+    "MULVS": (None, VECTOR_VS_TEMPLATE, "*"),
+
+    "CVM": (None, "VMR[0] = (1 << {mvl}) - 1\nemit(({tid}, 0, 0, 0, 0, 0, None))", None),
+    "POP": (None, "SRF[{o0}] = [bin(VMR[0]).count('1')]\nemit(({tid}, {o0}, 0, 0, 0, 0, None))", None),
+    "MTCL": ("0 < SRF[{o0}][0] <= {mvl}", "VL = SRF[{o0}][0]; VLR[0] = [VL]\nemit(({tid}, {o0}, 0, 0, 0, VL, None))", None),
+    "MFCL": (None, "VL = VLR[0][0]; SRF[{o0}] = [VL]\nemit(({tid}, {o0}, 0, 0, 0, VL, None))", None),
+
+    "LS": ("-SDSIZE <= SRF[{o1}][0] + {o2} < SDSIZE",
+           "ad = SRF[{o1}][0] + {o2}; SRF[{o0}] = [SD[ad]]\nemit(({tid}, {o0}, 0, 0, 0, ad, None))", None),
+    # Stores to a page that has not been written yet go to the handler, which marks it
+    "SS": ("-SDSIZE <= SRF[{o1}][0] + {o2} < SDSIZE and -2147483648 <= SRF[{o0}][0] <= 2147483647"
+           " and (SRF[{o1}][0] + {o2}) % SDSIZE >> " + str(PAGE_BITS) + " in SDDIRTY",
+           "ad = SRF[{o1}][0] + {o2}; SD[ad] = SRF[{o0}][0]\nemit(({tid}, {o0}, 0, 0, 0, ad, None))", None),
+
+    "ADD": (None, SCALAR_TEMPLATE, "+"),
+    "SUB": (None, SCALAR_TEMPLATE, "-"),
+    "AND": (None, SCALAR_TEMPLATE, "&"),
+    "OR":  (None, SCALAR_TEMPLATE, "|"),
+    "XOR": (None, SCALAR_TEMPLATE, "^"),
+    "SLL": ("SRF[{o2}][0] >= 0", SCALAR_TEMPLATE, "<<"),
+    "SRA": ("SRF[{o2}][0] >= 0", SCALAR_TEMPLATE, ">>"),
+    "SRL": ("SRF[{o2}][0] >= 0", "emit(({tid}, {o0}, {o1}, {o2}, 0, 0, None))\nSRF[{o0}] = [(SRF[{o1}][0] % 0x100000000) >> SRF[{o2}][0]]", None),
+
+    # Slice forms of the shuffles; only used for an even VLR and when the
+    # destination is not also a source, where element order does not matter
+    "UNPACKLO": ("VLR[0][0] % 2 == 0", SHUFFLE_TEMPLATE, "D[0:VL:2] = A[:H]; D[1:VL:2] = B[:H]"),
+    "UNPACKHI": ("VLR[0][0] % 2 == 0", SHUFFLE_TEMPLATE, "D[0:VL:2] = A[H:VL]; D[1:VL:2] = B[H:VL]"),
+    "PACKLO":   ("VLR[0][0] % 2 == 0", SHUFFLE_TEMPLATE, "D[:H] = A[0:VL:2]; D[H:VL] = B[0:VL:2]"),
+    "PACKHI":   ("VLR[0][0] % 2 == 0", SHUFFLE_TEMPLATE, "D[:H] = A[1:VL:2]; D[H:VL] = B[1:VL:2]"),
+}
+
+BRANCH_CONDITIONS = {"BEQ": "==", "BNE": "!=", "BGT": ">", "BLT": "<", "BGE": ">=", "BLE": "<="}
+
+class Core_func_blocks(Core_func):
+    """
+    Functional core that splits Code.asm into basic blocks ending at a branch
+    or HALT, compiles each block once into a Python function with the operands
+    of every instruction bound as constants, and runs block to block.
+    Produces exactly the same registers, memories and trace as Core_func.
+    """
+    def __init__(self, imem, sdmem, vdmem, arch = None):
+        self.block_caches = {} # trace level: {entry PC: compiled block}
+        super().__init__(imem, sdmem, vdmem, arch)
+        self.blocks = self.block_caches.setdefault(self.trace_level, {})
+
+    def use_trace_level(self, level):
+        super().use_trace_level(level)
+        self.blocks = self.block_caches.setdefault(level, {}) # blocks are compiled for one level
 
-    def dumpregs(self, iodir):
-        for rf in self.RFs.values():
-            rf.dump(iodir)
+    def block_error(self):
+        print("instruction:", self.IMEM.instructions[self.PC])
+        print("Error in executing statement")
+        print("Failed Execution")
 
-    
-    ## one method for each function
+    def compile_instruction(self, pc, idx, opcode, operands, namespace):
+        """
+        Function to generate the source of one instruction of a block
+        Returns : list of source lines, indented for the block function body
+        """
+        name = OPCODES[opcode] if opcode < OP_INVALID else None
+        handler = "h%d" % idx
+        namespace[handler] = self.dispatch[opcode]
+        call = ["core.PC = %d" % pc, "if %s(*%r) == -1: return core.block_error()" % (handler, operands)]
+
+        template = BLOCK_TEMPLATES.get(name)
+        if template is not None:
+            # Operands the interpreter would reject (or wrap around) always go to the handler
+            counts = {"S": self.SRF.reg_count, "V": self.VRF.reg_count}
+            if not all(0 <= op < counts[kind] for kind, op in zip(OPCODE_FORMATS[name], operands) if kind != "I"): template = None
+            elif name in ["UNPACKLO", "UNPACKHI", "PACKLO", "PACKHI"] and operands[0] in operands[1:]: template = None
+        if template is None: return call
+
+        guard, body, sym = template
+        fields = {"o%d" % i: op for i, op in enumerate(operands)}
+        fields["tid"] = TRACE_IDS[name]
+        fields["mvl"] = self.MVL
+        body = body.replace("{sym}", sym) if sym is not None else body
+        body = body.format(**fields).split("\n")
+        if self.trace_level != "full": body = [line for line in body if not line.startswith("emit(")]
+        if guard is None: return body
+        return ["if " + guard.format(**fields) + ":"] + ["    " + line for line in body] + ["else:"] + ["    " + line for line in call]
+
+    def compile_block(self, entry):
+        """
+        Function to compile the basic block starting at PC entry
+        Returns : function(core) that runs the block and returns the next PC,
+                  or None after HALT or an error
+        """
+        program = self.IMEM.program
+        namespace = {}
+        lines = ["def block(core):",
+                 "    SRF = core.SRF.registers; VRF = core.VRF.registers",
+                 "    VLR = core.VLR.registers; VMR = core.VMR.registers",
+                 "    SD = core.SDMEM.data; SDSIZE = core.SDMEM.size; SDDIRTY = core.SDMEM.dirty",
+                 "    emit = core.unrolled.append"]
+
+        pc = entry
+        size = 0 # instructions in the block
+        while pc < len(program):
+            ins = program[pc]
+            pc += 1
+            if ins is None: continue
+            size += 1
+            opcode, operands = ins
+
+            if opcode == OP_HALT:
+                lines += ["    core.PC = %d" % (pc - 1), "    core.execute_HALT()", "    return None"]
+                break
+
+            name = OPCODES[opcode] if opcode < OP_INVALID else None
+            if name in BRANCH_CONDITIONS:
+                ss1, ss2, IMM = operands
+                if 0 <= ss1 < self.SRF.reg_count and 0 <= ss2 < self.SRF.reg_count and -pow(2, 20) <= IMM <= pow(2, 20) and pc - 1 + IMM >= 0:
+                    lines += ["    nxt = %d if SRF[%d][0] %s SRF[%d][0] else %d" % (pc - 1 + IMM, ss1, BRANCH_CONDITIONS[name], ss2, pc)]
+                    if self.trace_level != "none": lines += ["    emit((%d, 0, 0, 0, 0, nxt, None))" % TRACE_IDS["B"]]
+                    lines += ["    return nxt"]
+                else:
+                    namespace["hb"] = self.dispatch[opcode]
+                    lines += ["    core.PC = %d" % (pc - 1),
+                              "    if hb(*%r) == -1: return core.block_error()" % (operands,),
+                              "    return core.PC + 1"]
+                break
+
+            lines += ["    " + line for line in self.compile_instruction(pc - 1, len(lines), opcode, operands, namespace)]
+            if opcode == OP_INVALID: break
+            if opcode in ROI_MARKERS:
+                # The trace level changes here, and with it the compiled code to run
+                lines += ["    return %d" % pc]
+                break
+        else:
+            # Ran off the end of the program; the next lookup fails like the interpreter does
+            lines += ["    return %d" % pc]
+
+        exec(compile("\n".join(lines), "<block %d>" % entry, "exec"), namespace)
+        namespace["block"].size = size
+        return namespace["block"]
+
+    def run(self, PC = 0, stop = None): # THIS IS OUR MAIN FUNCTION
+        # Blocks can only stop at their entry, so running up to a stop PC,
+        # profiling or counting is interpreted
+        if stop is not None or self.profile is not None or self.counters is not None: return super().run(PC, stop)
+        if self.watchdog is not None: return self.run_blocks_watched(PC)
+        self.PC = PC
+        pc = PC
+        try:
+            while pc is not None:
+                self.PC = pc
+                block = self.blocks.get(pc) # ROI markers switch between the caches of two levels
+                if block is None:
+                    self.IMEM.program[pc] # IndexError for a PC outside the program, like the interpreter
+                    block = self.blocks[pc] = self.compile_block(pc)
+                pc = block(self)
+        except IndexError:
+            if not self.outside_program(): raise
+
+    def run_blocks_watched(self, PC = 0):
+        # run() with the watchdog checked between blocks; a block that would
+        # overrun the instruction budget is interpreted, so that every engine
+        # stops at the same instruction
+        watchdog = self.watchdog
+        watchdog.start()
+        limit = watchdog.max_instructions
+        executed = 0
+        due = watchdog.next_check(executed)
+        self.PC = PC
+        pc = PC
+        try:
+            while pc is not None:
+                self.PC = pc
+                block = self.blocks.get(pc)
+                if block is None:
+                    self.IMEM.program[pc]
+                    block = self.blocks[pc] = self.compile_block(pc)
+                if limit is not None and executed + block.size > limit:
+                    return self.run_watched(pc, None, executed)
+                pc = block(self)
+                executed += block.size
+                if pc is not None and executed >= due >= 0:
+                    if watchdog.check(executed): break
+                    due = watchdog.next_check(executed)
+        except IndexError:
+            if not self.outside_program(): raise
+        watchdog.finish(executed)
+
+# Functional core implementations selectable with --engine
+ENGINES = {"list": Core_func, "numpy": Core_func_np, "blocks": Core_func_blocks}
 
 if __name__ == "__main__":
     #parse arguments for input file location
     parser = argparse.ArgumentParser(description='Vector Core Performance Model')
     parser.add_argument('--iodir', default="", type=str, help='Path to the folder containing the input files - instructions and data.')
+    parser.add_argument('--engine', default="list", choices=ENGINES, help='Functional core implementation to run the program with.')
+    parser.add_argument('--memformat', default="text", choices=["text", "binary", "sparse"], help='Format of the SDMEM/VDMEM input and output files; sparse files list address:value pairs.')
+    parser.add_argument('--dump', default="full", choices=DUMP_MODES, help='Write the whole data memories (full), every word of the pages the program wrote (modified) or only the words that changed (diff); modified and diff write address:value text files.')
+    parser.add_argument('--sdmem-bits', default=13, type=int, help='SDMEM holds 2^N words (default 13, at most %d).' % MAX_ADDRESS_LEN)
+    parser.add_argument('--vdmem-bits', default=17, type=int, help='VDMEM holds 2^N words (default 17, at most %d). Memories above 2^%d words are paged.' % (MAX_ADDRESS_LEN, FLAT_ADDRESS_LEN))
+    parser.add_argument('--paged', action='store_true', help='Allocate the data memories page by page as they are written, whatever their size.')
+    parser.add_argument('--trace-text', action='store_true', help='Also write the trace as text (trace.asm) for debugging.')
+    parser.add_argument('--restore', default=None, type=str, help='Resume from a checkpoint file instead of starting at PC 0.')
+    parser.add_argument('--checkpoint', default=None, type=str, help='Save a checkpoint to this file when execution reaches --checkpoint-pc, and stop there.')
+    parser.add_argument('--checkpoint-pc', default=None, type=int, help='Line of Code.asm (0 based) at which to take the checkpoint.')
+    parser.add_argument('--profile', action='store_true', help='Write per line execution counts (profile.txt) and a JSON summary (profile.json).')
+    parser.add_argument('--trace-level', default="full", choices=TRACE_LEVELS, help='Trace every instruction (full, needed for timing), only branches and HALT (control), or nothing (none) when only the output data is wanted.')
+    parser.add_argument('--max-instructions', default=None, type=int, help='Stop after executing this many instructions and write the state reached so far.')
+    parser.add_argument('--max-seconds', default=None, type=float, help='Stop after this many seconds of wall time and write the state reached so far.')
+    parser.add_argument('--progress', default=None, type=float, help='Print the instructions executed and instructions/s every N seconds.')
+    parser.add_argument('--counters', action='store_true', help='Write performance counters (instruction classes, active and masked elements, memory words, branch outcomes, VLR distribution) to counters.json.')
+    parser.add_argument('--check', action='store_true', help='Only assemble and validate Code.asm, caching its program image (Code.img), then exit.')
     args = parser.parse_args()
+    if args.checkpoint is not None and args.checkpoint_pc is None:
+        parser.error("--checkpoint needs --checkpoint-pc")
+    for bits in [args.sdmem_bits, args.vdmem_bits]:
+        if not 0 < bits <= MAX_ADDRESS_LEN: parser.error("memory address widths must be between 1 and %d bits" % MAX_ADDRESS_LEN)
 
     iodir = os.path.abspath(args.iodir)
     print("IO Directory:", iodir)
 
     # Parse IMEM
-    imem = IMEM_func(iodir)  
+    arch = load_arch(iodir)
+    imem = IMEM_func(iodir, arch)
+    if imem.errors: raise SystemExit(1)
+    if args.check: raise SystemExit(0)
     # Parse SMEM
-    sdmem = DMEM_func("SDMEM", iodir, 13) # 32 KB is 2^15 bytes = 2^13 K 32-bit words.
+    sdmem = DMEM_func("SDMEM", iodir, args.sdmem_bits, args.memformat, args.paged or None) # 32 KB is 2^15 bytes = 2^13 K 32-bit words by default.
     # Parse VMEM
-    vdmem = DMEM_func("VDMEM", iodir, 17) # 512 KB is 2^19 bytes = 2^17 K 32-bit words. 
+    vdmem = DMEM_func("VDMEM", iodir, args.vdmem_bits, args.memformat, args.paged or None) # 512 KB is 2^19 bytes = 2^17 K 32-bit words by default.
 
     # Create Vector Core
-    vcore = Core_func(imem, sdmem, vdmem)
+    vcore = ENGINES[args.engine](imem, sdmem, vdmem, arch)
+
+    start = 0
+    if args.restore is not None:
+        if vcore.restore(args.restore) == -1: raise SystemExit(1)
+        start = vcore.PC
+    if args.profile: vcore.enable_profile()
+    if args.counters: vcore.enable_counters()
+    if args.max_instructions is not None or args.max_seconds is not None or args.progress is not None:
+        vcore.enable_watchdog(args.max_instructions, args.max_seconds, args.progress)
+    vcore.set_trace_level(args.trace_level)
 
     # Run Core
-    vcore.run()   
+    if args.checkpoint is not None:
+        vcore.run(start, args.checkpoint_pc)
+        if vcore.PC == args.checkpoint_pc: vcore.checkpoint(args.checkpoint)
+        else: print("ERROR: Execution never reached PC", args.checkpoint_pc, "- no checkpoint saved")
+    else:
+        vcore.run(start)
     vcore.dumpregs(iodir)
-    
-    imem.Dump()
-    sdmem.dump()
-    vdmem.dump()
+    if args.profile: vcore.profile.dump(iodir, imem.instructions)
+    if args.counters: vcore.counters.dump(iodir)
+
+    if args.trace_level != "none": imem.Dump(args.trace_text, vcore.MVL)
+    sdmem.dump(args.dump)
+    vdmem.dump(args.dump)
 
-    # THE END
\ No newline at end of file
+    # THE END
@@ -368,8 +368,8 @@ LS SR7 SR0 11
 
 MTCL SR4
 
-LV VR4 416 # Load index vector for even elements
-LVI VR7 544 VR4 # Use LVI to load even elements in order of leaf nodes of recursion tree
+LV VR4 SR6 # Load index vector for even elements (was written as "416", which always read as SR6)
+LVI VR7 SR4 VR4 # Use LVI to load even elements in order of leaf nodes of recursion tree (was written as "544", which always read as SR4)
 
 # Load VR3, VR4, VR5, VR6
 PACKLO VR3 VR7 VR0
@@ -0,0 +1,225 @@
+import os
+import sys
+import mmap
+import argparse
+from array import array
+
+# Binary memory images are a flat sequence of little-endian 32 bit signed words,
+# word i of the memory at byte offset 4*i. No header, so an image can be mapped
+# straight into the simulator without parsing.
+#
+# Sparse text files hold one "address:value" pair per line (addresses in
+# decimal or 0x hex); every word not listed is zero.
+
+WORD_MIN = -pow(2, 31)
+PAGE_BITS = 12 # Paged memories allocate 4096 words (16 KB) at a time
+PAGE_WORDS = pow(2, PAGE_BITS)
+PAGE_MASK = PAGE_WORDS - 1
+ZERO_PAGE = bytes(4 * PAGE_WORDS)
+
+class PagedWords(object):
+    """
+    Word buffer for large address spaces. Pages of PAGE_WORDS int32 words are
+    allocated on the first write to them; untouched pages read as zero.
+    Supports the indexing and positive step slicing of array('i'), with
+    negative indices counting from the end.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.pages = {} # page number: array('i') of PAGE_WORDS words
+
+    def __len__(self):
+        return self.size
+
+    def page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            page = self.pages[number] = array('i', ZERO_PAGE)
+        return page
+
+    def index(self, idx):
+        if idx < 0: idx += self.size
+        if idx < 0 or idx >= self.size: raise IndexError("PagedWords index out of range")
+        return idx
+
+    def chunks(self, key):
+        # Splits a slice into (page number, start, stop, step) pieces, one per page
+        start, stop, step = key.indices(self.size)
+        if step <= 0: raise ValueError("PagedWords slices need a positive step")
+        while start < stop:
+            number = start >> PAGE_BITS
+            base = number << PAGE_BITS
+            end = min(base + PAGE_WORDS, stop)
+            yield number, start - base, end - base, step
+            start += len(range(start, end, step)) * step
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            idx = self.index(key)
+            page = self.pages.get(idx >> PAGE_BITS)
+            return 0 if page is None else page[idx & PAGE_MASK]
+
+        words = array('i')
+        for number, lo, hi, step in self.chunks(key):
+            page = self.pages.get(number)
+            if page is None: words.frombytes(bytes(4 * len(range(lo, hi, step))))
+            else: words.extend(page[lo:hi:step])
+        return words
+
+    def __setitem__(self, key, val):
+        if not isinstance(key, slice):
+            idx = self.index(key)
+            self.page(idx >> PAGE_BITS)[idx & PAGE_MASK] = val
+            return
+
+        val = array('i', val)
+        if len(val) != len(range(*key.indices(self.size))):
+            raise ValueError("PagedWords slice assignment must keep the size")
+        done = 0
+        for number, lo, hi, step in self.chunks(key):
+            count = len(range(lo, hi, step))
+            self.page(number)[lo:hi:step] = val[done:done + count]
+            done += count
+
+    def __iter__(self):
+        for number in range((self.size + PAGE_MASK) >> PAGE_BITS):
+            count = min(PAGE_WORDS, self.size - (number << PAGE_BITS))
+            page = self.pages.get(number)
+            if page is None: yield from bytes(count) # zeros
+            else: yield from page[:count]
+
+    def clear(self):
+        self.pages.clear()
+
+def nonzero_pages(words):
+    """
+    Function to list the pages of a word buffer that hold a non zero word
+    Returns : list of (page number, array('i') of the page's words); the last
+              page of a buffer that is not a whole number of pages is shorter
+    """
+    if isinstance(words, PagedWords):
+        return [(number, words.pages[number][:min(PAGE_WORDS, words.size - (number << PAGE_BITS))])
+                for number in sorted(words.pages) if any(words.pages[number])]
+
+    pages = []
+    for base in range(0, len(words), PAGE_WORDS):
+        page = array('i', words[base:base + PAGE_WORDS])
+        if page.tobytes().count(0) != 4 * len(page): pages.append((base >> PAGE_BITS, page))
+    return pages
+
+def to_words(values):
+    """
+    Function to pack values into an array('i'), wrapping anything outside
+    the 32 bit range the way a 32 bit memory word would
+    """
+    try:
+        return array('i', values)
+    except OverflowError:
+        return array('i', [((val - WORD_MIN) % pow(2, 32)) + WORD_MIN for val in values])
+
+def load_text(path):
+    # One decimal word per line, as in SDMEM.txt / VDMEM.txt
+    with open(path, 'r') as ipf:
+        return to_words([int(line.strip()) for line in ipf.readlines() if line.strip() != ''])
+
+def save_text(path, words):
+    with open(path, 'w') as opf:
+        opf.writelines([str(word) + '\n' for word in words])
+
+def load_sparse(path):
+    """
+    Function to read a sparse text file
+    Returns : list of (address, word) pairs in file order
+    """
+    pairs = []
+    with open(path, 'r') as ipf:
+        for line in ipf.readlines():
+            if line.strip() == '': continue
+            address, value = line.split(':')
+            pairs.append((int(address.strip(), 0), int(value.strip())))
+    addresses = [address for address, value in pairs]
+    return list(zip(addresses, to_words([value for address, value in pairs])))
+
+def save_pairs(path, pairs):
+    # Writes (address, word) pairs in the sparse text format
+    with open(path, 'w') as opf:
+        opf.writelines(["%d:%d\n" % (address, word) for address, word in pairs])
+
+def save_sparse(path, words):
+    # Only the non zero words are written, in address order
+    pairs = []
+    for number, page in nonzero_pages(words):
+        base = number << PAGE_BITS
+        pairs += [(base + offset, word) for offset, word in enumerate(page) if word != 0]
+    save_pairs(path, pairs)
+
+def load_image(path, size):
+    """
+    Function to load a binary image as a memory of `size` words
+    An image that covers the whole memory is mapped copy-on-write and used in
+    place; stores by the simulator never reach the file. Shorter images are
+    copied into a zero filled array.
+    Returns : buffer of int32 words supporting indexing, slicing and the buffer protocol
+    """
+    with open(path, 'rb') as ipf:
+        nbytes = os.fstat(ipf.fileno()).st_size
+        if size > 0 and nbytes >= 4 * size and sys.byteorder == 'little':
+            image = mmap.mmap(ipf.fileno(), 4 * size, access=mmap.ACCESS_COPY)
+            return memoryview(image).cast('i')
+
+        count = min(nbytes // 4, size)
+        words = array('i')
+        words.frombytes(ipf.read(4 * count))
+    if sys.byteorder == 'big': words.byteswap()
+    words.frombytes(bytes(4 * (size - count)))
+    return words
+
+def load_paged_image(path, size):
+    # Reads a binary image into a PagedWords, allocating only the non zero pages
+    words = PagedWords(size)
+    with open(path, 'rb') as ipf:
+        for number in range((size + PAGE_MASK) >> PAGE_BITS):
+            data = ipf.read(4 * min(PAGE_WORDS, size - (number << PAGE_BITS)))
+            if not data: break
+            if data.count(0) == len(data): continue
+            page = array('i')
+            page.frombytes(data[:len(data) - len(data) % 4])
+            if sys.byteorder == 'big': page.byteswap()
+            words.page(number)[:len(page)] = page
+    return words
+
+def save_image(path, words):
+    if isinstance(words, PagedWords):
+        with open(path, 'wb') as opf:
+            for number in range((words.size + PAGE_MASK) >> PAGE_BITS):
+                count = min(PAGE_WORDS, words.size - (number << PAGE_BITS))
+                page = words.pages.get(number)
+                if page is None:
+                    opf.write(bytes(4 * count))
+                    continue
+                page = page[:count]
+                if sys.byteorder == 'big': page.byteswap()
+                opf.write(page)
+        return
+
+    with open(path, 'wb') as opf:
+        if sys.byteorder == 'big':
+            words = array('i', words)
+            words.byteswap()
+        opf.write(words)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert SDMEM/VDMEM files between the text and binary image formats')
+    parser.add_argument('src', type=str, help='Input file; .txt for text, anything else is read as a binary image.')
+    parser.add_argument('dst', type=str, help='Output file; .txt for text, anything else is written as a binary image.')
+    args = parser.parse_args()
+
+    if args.src.endswith(".txt"):
+        words = load_text(args.src)
+    else:
+        with open(args.src, 'rb') as ipf:
+            words = load_image(args.src, os.fstat(ipf.fileno()).st_size // 4)
+
+    if args.dst.endswith(".txt"): save_text(args.dst, words)
+    else: save_image(args.dst, words)
+    print("Converted", len(words), "words from", args.src, "to", args.dst)
@@ -0,0 +1,100 @@
+import os
+import json
+
+# Per static instruction profile of a functional simulator run: how often each
+# line of Code.asm executed, the VLR it ran with and, for instructions that
+# honour the vector mask, how many of those elements were active.
+
+# Opcodes that work on VLR elements, and the subset of them that only touches
+# the elements whose VMR bit is set
+VECTOR_OPS = {"ADDVV", "SUBVV", "MULVV", "DIVVV", "ADDVS", "SUBVS", "MULVS", "DIVVS",
+              "SEQVV", "SNEVV", "SGTVV", "SLTVV", "SGEVV", "SLEVV",
+              "SEQVS", "SNEVS", "SGTVS", "SLTVS", "SGEVS", "SLEVS",
+              "LV", "SV", "LVI", "SVI", "LVWS", "SVWS",
+              "UNPACKLO", "UNPACKHI", "PACKLO", "PACKHI"}
+MASKED_OPS = {"ADDVV", "SUBVV", "MULVV", "DIVVV", "ADDVS", "SUBVS", "MULVS", "DIVVS",
+              "LV", "SV", "LVI", "SVI", "LVWS", "SVWS"}
+
+class Profile(object):
+    def __init__(self, program, opcodes):
+        # program : pre-decoded IMEM_func.program; opcodes : opcode names by id
+        size = len(program)
+        self.names = [None] * size
+        self.kind = [0] * size # 0: scalar, 1: vector, 2: masked vector
+        for pc, ins in enumerate(program):
+            if ins is None: continue
+            name = opcodes[ins[0]] if ins[0] < len(opcodes) else "INVALID"
+            self.names[pc] = name
+            self.kind[pc] = 2 if name in MASKED_OPS else 1 if name in VECTOR_OPS else 0
+
+        self.counts = [0] * size
+        self.vlr = [0] * size    # sum of VLR over all executions
+        self.active = [0] * size # sum of active elements over all executions
+
+    def count(self, core, pc):
+        # Called before the instruction at pc executes
+        self.counts[pc] += 1
+        kind = self.kind[pc]
+        if kind == 0: return
+        VLR = int(core.VLR.Read(0)[0])
+        self.vlr[pc] += VLR
+        if kind == 2: self.active[pc] += core.active_elements(VLR)
+
+    def averages(self, pcs):
+        # Average VLR and fraction of active elements over the executions of pcs
+        vector = [pc for pc in pcs if self.kind[pc] != 0]
+        masked = [pc for pc in pcs if self.kind[pc] == 2]
+        runs = sum([self.counts[pc] for pc in vector])
+        elements = sum([self.vlr[pc] for pc in masked])
+        avg_vlr = round(sum([self.vlr[pc] for pc in vector]) / runs, 2) if runs else None
+        density = round(sum([self.active[pc] for pc in masked]) / elements, 4) if elements else None
+        return avg_vlr, density
+
+    def summary(self, lines):
+        executed = [pc for pc in range(len(self.counts)) if self.counts[pc] > 0]
+        total = sum(self.counts)
+        opcodes = {}
+        for pc in executed: opcodes[self.names[pc]] = opcodes.get(self.names[pc], 0) + self.counts[pc]
+
+        avg_vlr, density = self.averages(executed)
+        pcs = []
+        for pc in sorted(executed, key = lambda pc: -self.counts[pc]):
+            pc_vlr, pc_density = self.averages([pc])
+            pcs.append({"pc": pc, "instruction": lines[pc], "count": self.counts[pc],
+                        "fraction": round(self.counts[pc] / total, 6),
+                        "avg_vlr": pc_vlr, "mask_density": pc_density})
+
+        return {"instructions": total,
+                "opcodes": dict(sorted(opcodes.items(), key = lambda item: -item[1])),
+                "avg_vlr": avg_vlr, "mask_density": density,
+                "pcs": pcs}
+
+    def listing(self, lines):
+        total = max(sum(self.counts), 1)
+        out = ["%10s %8s %7s %6s | %s\n" % ("count", "%", "avgVLR", "mask", "Code.asm")]
+        for pc, line in enumerate(lines):
+            if self.counts[pc] == 0:
+                out.append("%10s %8s %7s %6s | %s\n" % ("", "", "", "", line))
+                continue
+            avg_vlr, density = self.averages([pc])
+            out.append("%10d %7.2f%% %7s %6s | %s\n" % (self.counts[pc], 100 * self.counts[pc] / total,
+                       "" if avg_vlr is None else "%.1f" % avg_vlr,
+                       "" if density is None else "%.2f" % density, line))
+        return out
+
+    def dump(self, iodir, lines):
+        """
+        Function to write the annotated listing (profile.txt) and the JSON
+        summary (profile.json) into iodir
+        Args : lines : source lines of Code.asm, one per PC
+        """
+        listpath = os.path.abspath(os.path.join(iodir, "profile.txt"))
+        jsonpath = os.path.abspath(os.path.join(iodir, "profile.json"))
+        try:
+            with open(listpath, 'w') as opf:
+                opf.writelines(self.listing(lines))
+            with open(jsonpath, 'w') as opf:
+                json.dump(self.summary(lines), opf, indent = 2)
+            print("Profile - Dumped annotated listing and summary into:", listpath, jsonpath)
+        except:
+            print("Profile - ERROR: Couldn't write profile files in path:", iodir)
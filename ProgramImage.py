@@ -0,0 +1,61 @@
+import struct
+import hashlib
+
+# Binary image of an assembled Code.asm: the pre-decoded record of every line,
+# cached next to the source so later runs load it in one read instead of
+# parsing and validating the text again.
+#
+# File layout (little-endian):
+#   header  : magic "VIMG", format version (u16), key (20 bytes), line count (u32)
+#   records : one per line of Code.asm; opcode id (u16, NONE for lines
+#             without an instruction), operand count (u16), three int32 operands
+# The key is a SHA-1 hash of everything the records depend on: the source, the
+# architecture parameters and the opcode table. An image with another key is stale.
+
+MAGIC = b"VIMG"
+VERSION = 1
+HEADER = struct.Struct("<4sH20sI")
+RECORD = struct.Struct("<HHiii")
+NONE = 0xFFFF
+
+def key(source, arch, opcodes):
+    """
+    Function to compute the cache key of a program image
+    Args : source : text of Code.asm; arch : architecture parameters;
+           opcodes : opcode names by id
+    """
+    digest = hashlib.sha1(source.encode())
+    digest.update(repr(sorted(arch.items())).encode())
+    digest.update(" ".join(opcodes).encode())
+    return digest.digest()
+
+def save(path, key, program):
+    body = bytearray(HEADER.pack(MAGIC, VERSION, key, len(program)))
+    for ins in program:
+        if ins is None:
+            body += RECORD.pack(NONE, 0, 0, 0, 0)
+            continue
+        opcode, operands = ins
+        body += RECORD.pack(opcode, len(operands), *(operands + (0,) * (3 - len(operands))))
+    with open(path, 'wb') as opf:
+        opf.write(body)
+
+def load(path, key):
+    """
+    Function to read a program image saved by save()
+    Returns : list of (opcode id, operands) or None per line, or None if the
+              file is missing, malformed or was built for another key
+    """
+    try:
+        with open(path, 'rb') as ipf:
+            data = ipf.read()
+        magic, version, saved, count = HEADER.unpack_from(data, 0)
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC or version != VERSION or saved != key: return None
+    if len(data) != HEADER.size + count * RECORD.size: return None
+
+    program = []
+    for opcode, length, *operands in RECORD.iter_unpack(data[HEADER.size:]):
+        program.append(None if opcode == NONE else (opcode, tuple(operands[:length])))
+    return program
@@ -1,5 +1,16 @@
 import os
+import math
 import argparse
+import heapq
+import functools
+import itertools
+from collections import deque
+
+import TraceFormat
+import Watchdog
+from TraceFormat import TRACE_OPS, TRACE_IDS, ROI_OP
+
+HALT_OP = TRACE_IDS["HALT"]
 
 class Config(object):
     def __init__(self, iodir):
@@ -15,15 +26,25 @@ class Config(object):
             print("Config - ERROR: Couldn't open file in path:", self.filepath)
             raise
 
+        # Architectural parameters are optional and default to the original design
+        for name, value in TraceFormat.ARCH_DEFAULTS.items(): self.parameters.setdefault(name, value)
+        TraceFormat.check_arch(self.parameters)
+
 class IMEM(object):
-    def __init__(self, iodir):
+    def __init__(self, iodir, traceformat = "binary", MVL = 64):
         #self.size = pow(2, 16) # Can hold a maximum of 2^16 instructions.
-        self.filepath = os.path.abspath(os.path.join(iodir, "trace.asm"))
-        self.instructions = []
+        # Reads the binary trace.bin, or the text trace.asm when traceformat is "text"
+        self.filepath = os.path.abspath(os.path.join(iodir, "trace.bin" if traceformat == "binary" else "trace.asm"))
+        self.instructions = [] # trace records and loop records, see TraceFormat
+        self.MVL = MVL # binary traces record the MVL they were written with
+        self.cursor = iter([]) # expands loop records while the core fetches
+        self.next_idx = -1
 
         try:
-            with open(self.filepath, 'r') as insf:
-                self.instructions = [ins.split('#')[0].strip() for ins in insf.readlines() if not (ins.startswith('#') or ins.strip() == '')]
+            if traceformat == "binary":
+                self.instructions, self.MVL = TraceFormat.read_binary(self.filepath)
+            else:
+                self.instructions = TraceFormat.read_text(self.filepath, self.MVL)
             print("IMEM - Instructions loaded from file:", self.filepath)
             # print("IMEM - Instructions:", self.instructions)
         except:
@@ -31,400 +52,428 @@ class IMEM(object):
             raise
 
     def Read(self, idx): # Use this to read from IMEM.
-        #if idx < self.size:
-            return self.instructions[idx].split()
-        #else:
-            #print("IMEM - ERROR: Invalid memory access at index: ", idx, " with memory size: ", self.size)
-            #return -1
+        # The core fetches in order, so loops are unrolled one record at a time;
+        # any other index (e.g. a new run starting at 0) restarts the expansion
+        if idx != self.next_idx:
+            self.cursor = itertools.islice(TraceFormat.expand(self.instructions), idx, None)
+        self.next_idx = idx + 1
+        record = next(self.cursor, None)
+        if record is None:
+            print("IMEM - ERROR: Invalid memory access at index: ", idx)
+            return -1
+        return record
+
+class IMEM_stream(object):
+    # Feeds the core straight from a running functional core (Core_func.stream())
+    # or any other iterable of trace records, so no trace file is written and
+    # only the instructions in flight are held in memory. The core fetches
+    # strictly in order, so idx only matters for error reporting.
+    def __init__(self, records):
+        self.records = iter(records)
+
+    def Read(self, idx):
+        try:
+            return next(self.records)
+        except StopIteration:
+            print("IMEM - ERROR: Instruction stream ended without HALT at index:", idx)
+            return -1
 
 class instruction():
-    def __init__(self,instr_name,instr_queue,src_regs,dst_regs,smem_ad,vmem_ad,
-                 instr_cycleCount,vectorLength,vectorMask,computeResource):
-       # Each instruction after decoding will contain the following metadata
-        self.instr_name = instr_name
-        self.instr_queue = instr_queue              # number indicating which queue to enter
-                                                    # 0: VectorCompute Queue; 1: VectorData Queue; 2: ScalarOps Queue
-        self.src_regs = src_regs                    # list of all scalar registers used
-        self.dst_regs = dst_regs                    # likewise for vector registers
-        self.smem_ad = smem_ad                      # list of all scalar memory addresses used
-        self.vmem_ad = vmem_ad                      # likewise for vector memory addresses
-        self.instr_cycleCount = instr_cycleCount    # Number of cycles instruction takes
-        self.vectorLength = vectorLength
-        self.vectorMask = vectorMask
-        self.computeResource = computeResource
-    
-    def __init__(self):
-        # Constructor with default values
+    # Each instruction after decoding will contain the following metadata. Registers
+    # are kept as bitmasks with bit r set for register r, which is all the busyboard
+    # needs; __slots__ keeps the records small, as one is made per trace record
+    __slots__ = ("instr_name", "instr_queue", "scalar_regs", "vector_regs", "smem_ad", "vmem_ad",
+                 "instr_cycleCount", "vectorLength", "vectorMask", "computeResource")
+
+    def __init__(self, MVL = 64, vectorMask = None):
+        # Constructor with default values; vectorMask : mask shared by the
+        # instructions of a core, all MVL elements active if None
         self.instr_name = ""
-        self.instr_queue = -1
-        self.src_regs = {"Scalar":[],"Vector":[]}
-        self.dst_regs = {"Scalar":[],"Vector":[]}
-        self.smem_ad = []
-        self.vmem_ad = []
-        self.instr_cycleCount = 0
-        self.vectorLength = 64
-        self.vectorMask = [1 for i in range(64)]
+        self.instr_queue = -1                       # number indicating which queue to enter
+                                                    # 0: VectorCompute Queue; 1: VectorData Queue; 2: ScalarOps Queue
+        self.scalar_regs = 0                        # scalar registers used, as source or destination
+        self.vector_regs = 0                        # likewise for vector registers
+        self.smem_ad = None                         # scalar memory address used
+        self.vmem_ad = ()                           # vector memory addresses used
+        self.instr_cycleCount = 0                   # Number of cycles instruction takes
+        self.vectorLength = MVL
+        self.vectorMask = (1 << MVL) - 1 if vectorMask is None else vectorMask # bitmask, bit i set when element i is active
         self.computeResource = ""
 
+# The cycles a vector memory access takes depend only on the lane and bank of
+# every active element and on the banks still busy from before, so they are
+# memoized under that signature in a bounded LRU cache; kernels issue the
+# same access shapes over and over.
+MEMORY_CACHE_SIZE = 4096
+
+def simulate_banks(addrs, state, numLanes, numBanks, vlsPipelineDepth, bankBusyTime):
+    """
+    Function to simulate the lanes and banks of the memory unit for one vector
+    access, going from one dispatch to the next instead of cycle by cycle
+    Args    : addrs : addresses of the active elements in element order
+              state : remaining busy cycles of every bank, -1 for a free bank
+    Returns : tuple : (number of cycles, state of the banks afterwards)
+    """
+    # cycles are counted from the first one of the access. A bank busy for count
+    # more cycles takes a request again in cycle count, and one dispatched in
+    # cycle c is busy for bankBusyTime more, i.e. takes one again in c + bankBusyTime + 1
+    free_at = [max(count, 0) for count in state]
+    finish = max(state, default = -1) + 1 # first cycle with all banks free
+
+    # creating the queues for each lane, holding the bank each of its memory accesses goes to
+    vls_pipelines = [[] for i in range(numLanes)]
+    for addr in addrs: vls_pipelines[addr % numLanes].append(addr % numBanks)
+    heads = [0 for i in range(numLanes)]
+
+    # (earliest cycle the head of a lane can dispatch, lane) for the lanes with work left;
+    # popping in that order gives priority to the lower index within a cycle
+    ready = [(free_at[lane[0]], idx) for idx, lane in enumerate(vls_pipelines) if lane]
+    heapq.heapify(ready)
+    while ready:
+        cycle, idx = ready[0]
+        lane = vls_pipelines[idx]
+        bank_idx = lane[heads[idx]]
+
+        # a lower lane took the bank in the meantime: wait until it is free again
+        if free_at[bank_idx] > cycle:
+            heapq.heapreplace(ready, (free_at[bank_idx], idx))
+            continue
+
+        free_at[bank_idx] = cycle + bankBusyTime + 1
+        finish = max(finish, free_at[bank_idx] + 1)
+        heads[idx] += 1
+        if heads[idx] < len(lane): heapq.heapreplace(ready, (max(cycle + 1, free_at[lane[heads[idx]]]), idx))
+        else: heapq.heappop(ready)
+
+    # the access ends in the first cycle with every lane drained and every bank free
+    return vlsPipelineDepth - 1 + finish, tuple(-1 for i in range(numBanks))
+
+bank_timing = functools.lru_cache(maxsize = MEMORY_CACHE_SIZE)(simulate_banks)
+
+def strided_timing(base, stride, count, numLanes, numBanks, vlsPipelineDepth, bankBusyTime):
+    """
+    Function to compute without simulating what simulate_banks() returns for
+    the count addresses base, base + stride, ... starting with all banks free
+    Returns : number of cycles (the banks end up free), or None if the access
+              is not of the form solved here and has to be simulated
+    """
+    if count == 0: return vlsPipelineDepth - 1
+
+    # with stride coprime to numLanes, every numLanes consecutive elements go to
+    # different lanes, so element j is the (j // numLanes)-th request of its lane
+    # and lane (base + r * stride) % numLanes serves the elements j = r mod numLanes
+    if math.gcd(stride, numLanes) != 1: return None
+
+    # group k (elements k * numLanes ...) uses the same banks, lane for lane, as
+    # group k + period. If the groups of one period use all different banks, no
+    # two lanes ever share a bank and each lane only waits for itself
+    period = numBanks // math.gcd(numLanes * stride, numBanks)
+    if period * numLanes > numBanks: return None
+    banks = {(base + j * stride) % numBanks for j in range(period * numLanes)}
+    if len(banks) != period * numLanes: return None
+
+    # so all lanes dispatch group k in the same cycle: one group per cycle, except
+    # that group k waits bankBusyTime + 1 cycles after group k - period for its banks.
+    # The banks are free again bankBusyTime + 2 cycles after the last dispatch
+    last = (count - 1) // numLanes
+    dispatch = (last // period) * max(period, bankBusyTime + 1) + last % period
+    return vlsPipelineDepth + bankBusyTime + 1 + dispatch
+
+def set_memory_cache_size(maxsize):
+    # Replace the cache of bank_timing() by an empty one holding up to maxsize
+    # access signatures; 0 disables caching
+    global bank_timing
+    bank_timing = functools.lru_cache(maxsize = maxsize)(simulate_banks)
+
+def memory_cache_stats():
+    """
+    Function to report how well the bank_timing() cache works
+    Returns : dict : hits, misses, entries in use and the maximum
+    """
+    info = bank_timing.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize, "maxsize": info.maxsize}
+
 class Core():
     def __init__(self, imem, config):
         self.IMEM = imem
         self.config = config
         self.PC = 0
-        self.VLR = 64
-        self.VMR = [1 for i in range(64)]
-       
-        self.busyBoard = {"scalar": [False for i in range(8)],"vector": [False for i in range(8)]}
-
-        self.queues = {"vectorCompute":[],
-                       "vectorData":[],
-                       "scalarOps":[]
-                       }
-        
-        self.fetched_instr_current = []
-        self.fetched_instr_prev = []
-        
-        self.instrToBeQueued = instruction()
-        self.instrToBeCompute = instruction()
-        self.decode_input = []
+        self.MVL = self.config.parameters["MVL"]
+        if getattr(imem, "MVL", self.MVL) != self.MVL:
+            print("Core - ERROR: The trace was recorded with an MVL of", imem.MVL, "but Config.txt sets", self.MVL)
+            raise ValueError("MVL of the trace and Config.txt differ")
+        self.full_mask = (1 << self.MVL) - 1 # every element active; shared by the instructions
+        self.VLR = self.MVL
+        self.VMR = self.full_mask # bitmask, bit i set when element i is active
+
+        # busyboard: bit r set while register r is in use
+        self.busy_scalar = 0
+        self.busy_vector = 0
+
+        # indexed by instr_queue: vectorCompute, vectorData and scalarOps
+        self.queues = [deque(), deque(), deque()]
+        self.queue_names = ["Compute", "Vector Data", "Scalar"]
+        self.queue_depths = [self.config.parameters["computeQueueDepth"], self.config.parameters["dataQueueDepth"],
+                             self.config.parameters["computeQueueDepth"]]
+
+        self.instrToBeQueued = None # decoded decode_input, while it waits for its queue
+        self.decode_input = None
         self.instrToBeExecuted = [None, None, None]
         self.resources_busy = {"Adder":[None,0],"Multiplier":[None,0],
                                "Divider":[None,0],"Shuffle":[None,0],
                                "Memory":[None,0],
                                "Scalar": [None, 0]
                               }
+        self.compute_units = [self.resources_busy[name] for name in ["Adder", "Multiplier", "Divider", "Shuffle"]]
+        self.pipeline_depths = {"Adder": self.config.parameters["pipelineDepthAdd"], "Multiplier": self.config.parameters["pipelineDepthMul"],
+                                "Divider": self.config.parameters["pipelineDepthDiv"], "Shuffle": self.config.parameters["pipelineDepthShuffle"]}
+
+        # pending work, kept up to date so the end of the run is seen without rescanning everything
+        self.queued = 0     # instructions in the queues
+        self.units_busy = 0 # resources holding an instruction
         self.banks_busy = [[False,0] for i in range(self.config.parameters["vdmNumBanks"])]
+        numLanes = self.config.parameters["numLanes"]
+        self.lane_masks = [sum([1 << i for i in range(lane, self.MVL, numLanes)]) for lane in range(numLanes)]
         
         self.nop = {"Fetch":False,"Decode":True,"SendToCompute":True}
+        self.watchdog = None # Watchdog.Watchdog while budgets are set, see enable_watchdog()
+        self.skip_idle = True # jump over cycles in which only countdowns change, see idle_cycles()
+        self.check_memory_timing = False # also simulate the accesses strided_timing() solves, and compare
                 
         
-    def decode(self,instr_list):
+    def decode(self,record):
         """
-        Function to convert the instruction in a list format and creates an 
+        Function to convert a trace record and creates an 
         instruction object with the relavent properties.
 
-        Input   : instruction in list format
+        Input   : trace record (see TraceFormat)
         Output  : Object of instruction class
         """
         # convert instuction list to instruction format
         # creating instruction object and loading default values
 
-        # TODO: Incorporate VLR in the instruction
-
-        ins = instruction()
-        ins.instr_name = instr_list[0]
-        
+        ins = instruction(self.MVL, self.full_mask)
+        op, r0, r1, r2, vlr, value, payload = record
+        ins.instr_name = name = TRACE_OPS[op]
 
-        if(ins.instr_name in ["ADDVV","SUBVV"]):
+        if(name in ["ADDVV","SUBVV"]):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[2][2:]),int(instr_list[3][2:])]
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1 | 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Adder"
 
-        elif(ins.instr_name in ["ADDVS","SUBVS"]):
+        elif(name in ["ADDVS","SUBVS"]):
             ins.instr_queue = 0
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
-            ins.src_regs["Vector"] = [int(instr_list[2][2:])]
-            ins.src_regs["Scalar"] = [int(instr_list[3][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1
+            ins.scalar_regs = 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Adder"
 
-        elif(ins.instr_name == "MULVV"):
+        elif(name == "MULVV"):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[2][2:]),int(instr_list[3][2:])]
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1 | 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Multiplier"
 
-        elif(ins.instr_name == "MULVS"):
+        elif(name == "MULVS"):
             ins.instr_queue = 0
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
-            ins.src_regs["Vector"] = [int(instr_list[2][2:])]
-            ins.src_regs["Scalar"] = [int(instr_list[3][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1
+            ins.scalar_regs = 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Multiplier"
 
-        elif(ins.instr_name == "DIVVV"):
+        elif(name == "DIVVV"):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[2][2:]),int(instr_list[3][2:])]
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1 | 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Divider"
 
-        elif(ins.instr_name == "DIVVS"):
+        elif(name == "DIVVS"):
             ins.instr_queue = 0
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
-            ins.src_regs["Vector"] = [int(instr_list[2][2:])]
-            ins.src_regs["Scalar"] = [int(instr_list[3][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1
+            ins.scalar_regs = 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Divider"
 
-        elif(ins.instr_name =="SVV"):
+        elif(name =="SVV"):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[1][2:]),int(instr_list[2][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1
             ins.vectorLength = self.VLR
-            self.VMR = [int(ele) for ele in instr_list[3][1:-1].split(",")]
+            self.VMR = payload
             ins.computeResource = "Adder"
 
-        elif(ins.instr_name == "SVS"):
+        elif(name == "SVS"):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[1][2:])]
-            ins.src_regs["Scalar"] = [int(instr_list[2][2:])]
-            self.VMR = [int(ele) for ele in instr_list[3][1:-1].split(",")]
+            ins.vector_regs = 1 << r0
+            ins.scalar_regs = 1 << r1
+            self.VMR = payload
             ins.computeResource = "Adder"
 
-        elif(ins.instr_name in ["CVM"]):
+        elif(name in ["CVM"]):
             ins.instr_queue = 0
-            self.VMR=[1]*64
+            self.VMR = self.full_mask
             ins.computeResource = "Adder"
             
-        elif(ins.instr_name in ["POP","MFCL"]):
+        elif(name in ["POP","MFCL"]):
             ins.instr_queue = 2
-            ins.s_regs = [int(instr_list[1][2:])]
             
-        elif(ins.instr_name in ["MTCL"]):
+        elif(name in ["MTCL"]):
             ins.instr_queue = 2
-            ins.s_regs = [int(instr_list[1][2:])]
-            self.VLR = int(instr_list[2][1:-1])
+            self.VLR = value
             ins.vectorLength = self.VLR
 
-        elif(ins.instr_name in ["LV","LVI","LVWS",]):
+        elif(name in ["LV","LVI","LVWS","SV","SVI","SVWS"]):
             ins.instr_queue = 1
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
-            #ins.vmem_ad = instr_list[2][1:-1].split(",")
-            ins.vmem_ad = [int(ele) for ele in instr_list[2][1:-1].split(",")]
+            ins.vector_regs = 1 << r0
+            ins.vmem_ad = payload
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
 
-        elif(ins.instr_name in ['SV','SVI','SVWS']):
-            ins.instr_queue = 1
-            ins.src_regs["Vector"] = [int(instr_list[1][2:])]
-            #ins.vmem_ad = instr_list[2][1:-1].split(",")
-            ins.vmem_ad = [int(ele) for ele in instr_list[2][1:-1].split(",")]
-            ins.vectorLength = self.VLR
-            ins.vectorMask = self.VMR
-
-        elif(ins.instr_name in ["LS"]):
-            ins.instr_queue = 2
-            ins.dst_regs["Scalar"] = [int(instr_list[1][2:])]
-            ins.smem_ad = instr_list[2][1:-1].split(",")
-
-        elif(ins.instr_name in ["SS"]):
+        elif(name in ["LS","SS"]):
             ins.instr_queue = 2
-            ins.src_regs["Scalar"] = [int(instr_list[1][2:])]
-            ins.smem_ad = instr_list[2][1:-1].split(",")        
+            ins.scalar_regs = 1 << r0
+            ins.smem_ad = value
 
-        elif(ins.instr_name in ["ADD","SUB","AND","OR","XOR","SLL","SRL","SRA"]):
+        elif(name in ["ADD","SUB","AND","OR","XOR","SLL","SRL","SRA"]):
             ins.instr_queue = 2
-            ins.dst_regs["Scalar"] = [int(instr_list[1][2:])]
-            ins.src_regs["Scalar"] = [int(instr_list[2][2:]),int(instr_list[3][2:])]
+            ins.scalar_regs = 1 << r0 | 1 << r1 | 1 << r2
         
-        elif(ins.instr_name == "B"):
+        elif(name == "B"):
             ins.instr_queue = 2 # again confirm if correct
 
-        elif(ins.instr_name in ["UNPACKLO","UNPACKHI","PACKLO","PACKHI"]):
+        elif(name in ["UNPACKLO","UNPACKHI","PACKLO","PACKHI"]):
             ins.instr_queue = 0
-            ins.src_regs["Vector"] = [int(instr_list[2][2:]),int(instr_list[3][2:])]
-            ins.dst_regs["Vector"] = [int(instr_list[1][2:])]
+            ins.vector_regs = 1 << r0 | 1 << r1 | 1 << r2
             ins.vectorLength = self.VLR
             ins.vectorMask = self.VMR
             ins.computeResource = "Shuffle"
         
-        elif (ins.instr_name =="HALT"): self.nop["Fetch"] = True
+        elif (name =="HALT"): self.nop["Fetch"] = True
         return ins
     
     def CheckQueue(self,ins):
         # checking if queues are full (saves busyboard lookup)
-        if(ins.instr_queue == 0):
-            if(len(self.queues["vectorCompute"])>self.config.parameters["computeQueueDepth"]):
-                print("Compute Queue depth exceeded")
-            if(len(self.queues["vectorCompute"])>=self.config.parameters["computeQueueDepth"]):
-                return False
-        elif(ins.instr_queue == 1):
-            if(len(self.queues["vectorData"])>self.config.parameters["dataQueueDepth"]):
-                print("Vector Data Queue depth exceeded")
-            if(len(self.queues["vectorData"])>=self.config.parameters["dataQueueDepth"]):
-                return False
-        elif(ins.instr_queue == 2):
-            if(len(self.queues["scalarOps"])>self.config.parameters["computeQueueDepth"]):
-                print("Scalar Queue depth exceeded")
-            if(len(self.queues["scalarOps"])>=self.config.parameters["computeQueueDepth"]):
-                return False
-        elif(ins.instr_name == "HALT"): return False
+        if ins.instr_queue < 0: return False # HALT
+        queued, depth = len(self.queues[ins.instr_queue]), self.queue_depths[ins.instr_queue]
+        if queued > depth: print(self.queue_names[ins.instr_queue], "Queue depth exceeded")
+        if queued >= depth: return False
 
         # checking busyboard
-        for reg in ins.src_regs["Scalar"]:
-            if self.busyBoard["scalar"][reg]: return False
-        for reg in ins.src_regs["Vector"]:
-            if self.busyBoard["vector"][reg]: return False
-
-        for reg in ins.dst_regs["Scalar"]:
-            if self.busyBoard["scalar"][reg]: return False
-        for reg in ins.dst_regs["Vector"]:
-            if self.busyBoard["vector"][reg]: return False
-        
-        return True
+        return not (ins.scalar_regs & self.busy_scalar or ins.vector_regs & self.busy_vector)
     
     def sendToQueue(self,ins):
         """
         Function appends the instruction to the appropriate queue
         Also sets the busyboard to high for the registers used by the instruction
+        (vector registers for the vector queues, scalar ones for the scalar queue)
         input   : instruction object
         output  : status of appending to the queue
         """
-        if(ins.instr_queue == 0):
-            if(len(self.queues["vectorCompute"])<self.config.parameters["computeQueueDepth"]):
-                self.queues["vectorCompute"].append(ins)
-                for reg in ins.src_regs["Vector"]: self.busyBoard["vector"][reg] = True
-                for reg in ins.dst_regs["Vector"]: self.busyBoard["vector"][reg] = True
-            else: return -1
-        elif(ins.instr_queue == 1):
-            if(len(self.queues["vectorData"])<self.config.parameters["dataQueueDepth"]):
-                self.queues["vectorData"].append(ins)
-                for reg in ins.src_regs["Vector"]:self.busyBoard["vector"][reg] = True
-                for reg in ins.dst_regs["Vector"]:self.busyBoard["vector"][reg] = True
-            else: return -1
-        elif(ins.instr_queue == 2):
-            if(len(self.queues["scalarOps"])<self.config.parameters["computeQueueDepth"]):
-                self.queues["scalarOps"].append(ins)
-                for reg in ins.src_regs["Scalar"]: self.busyBoard["scalar"][reg] = True
-                for reg in ins.dst_regs["Scalar"]: self.busyBoard["scalar"][reg] = True
-            else: return -1
+        queue = self.queues[ins.instr_queue]
+        if len(queue) >= self.queue_depths[ins.instr_queue]: return -1
+        queue.append(ins)
+        self.queued += 1
+        if ins.instr_queue == 2: self.busy_scalar |= ins.scalar_regs
+        else: self.busy_vector |= ins.vector_regs
         return 0
+
+    def release(self, ins):
+        # Clears the busyboard for every register of an instruction that is done
+        self.busy_scalar &= ~ins.scalar_regs
+        self.busy_vector &= ~ins.vector_regs
     
     def checkResources(self):
         """
         Function to check whether the compute resource is available or not
         Returns a list of 3 booleans
         """
-        res_list = [False,False,False]
-        if len(self.queues["vectorCompute"]) > 0:
-            instr = self.queues["vectorCompute"][0]
-            if(self.resources_busy[instr.computeResource][0] is None): res_list[0] = True
-        if len(self.queues["vectorData"]) > 0:
-            if(self.resources_busy["Memory"][0] is None): res_list[1] = True
-        if len(self.queues["scalarOps"]) > 0:  res_list[2] = True
-
-        return res_list
+        compute, data, scalar = self.queues
+        return [len(compute) > 0 and self.resources_busy[compute[0].computeResource][0] is None,
+                len(data) > 0 and self.resources_busy["Memory"][0] is None,
+                len(scalar) > 0]
     
     def sendToResources(self,condition_list): 
         
         returned_inst_list = [None,None,None]
-
-        if len(self.queues["vectorCompute"])>0 and condition_list[0]==True:
-            returned_inst_list[0] = self.queues["vectorCompute"].pop(0)
-
-        if len(self.queues["vectorData"])>0 and condition_list[1]==True:
-            returned_inst_list[1] = self.queues["vectorData"].pop(0)
-
-        if len(self.queues["scalarOps"])>0 and condition_list[2]==True:
-            returned_inst_list[2] = self.queues["scalarOps"].pop(0)
+        for idx, queue in enumerate(self.queues):
+            if condition_list[idx]:
+                returned_inst_list[idx] = queue.popleft()
+                self.queued -= 1
         
         return returned_inst_list
     
     def calculateNoComputeCycles(self,instr):
         # Requires Discussion
-        lanes = [0]*self.config.parameters["numLanes"]
-        for i in range(instr.vectorLength):
-            lanes[i%self.config.parameters["numLanes"]] += instr.vectorMask[i]
-
-        if instr.computeResource == "Adder":
-            cycleCount = self.config.parameters["pipelineDepthAdd"] + max(lanes) - 1 
-        elif instr.computeResource == "Multiplier":
-            cycleCount = self.config.parameters["pipelineDepthMul"] + max(lanes) - 1 
-        elif instr.computeResource == "Divider":
-            cycleCount = self.config.parameters["pipelineDepthDiv"] + max(lanes) - 1 
-        elif instr.computeResource == "Shuffle":
-            cycleCount = self.config.parameters["pipelineDepthShuffle"] + max(lanes) - 1 
+        # active elements per lane: lane l gets elements l, l + numLanes, ... (see lane_masks)
+        active = instr.vectorMask & ((1 << instr.vectorLength) - 1)
+        lanes = [bin(active & lane_mask).count("1") for lane_mask in self.lane_masks]
 
-        return cycleCount
+        return self.pipeline_depths[instr.computeResource] + max(lanes) - 1
     
     def compute(self):
     
         # decrement all counters if not zero
-        keys = list(self.resources_busy.keys())
-        for resource in keys[:-2]:
-            if self.resources_busy[resource][0] is not None:
-                if self.resources_busy[resource][1] > 0:
-                    self.resources_busy[resource][1] -= 1
-                    #print(self.resources_busy[resource][1])
+        for unit in self.compute_units:
+            if unit[0] is not None:
+                if unit[1] > 0:
+                    unit[1] -= 1
                 else:
-                    for reg in self.resources_busy[resource][0].src_regs["Scalar"]:
-                        self.busyBoard["scalar"][reg] = False
-                    for reg in self.resources_busy[resource][0].src_regs["Vector"]:
-                        self.busyBoard["vector"][reg] = False
-                    for reg in self.resources_busy[resource][0].dst_regs["Scalar"]:
-                        self.busyBoard["scalar"][reg] = False
-                    for reg in self.resources_busy[resource][0].dst_regs["Vector"]:
-                        self.busyBoard["vector"][reg] = False
-
-                    self.resources_busy[resource][0] = None
-                    self.resources_busy[resource][1] = 0
+                    self.release(unit[0])
+                    unit[0] = None
+                    unit[1] = 0
+                    self.units_busy -= 1
             
         if self.instrToBeExecuted[0] is not None:
             instr = self.instrToBeExecuted[0]
-            self.resources_busy[instr.computeResource][0] = instr
-            self.resources_busy[instr.computeResource][1] = self.calculateNoComputeCycles(instr) -1
-            #print(self.resources_busy[instr.computeResource][1])
+            unit = self.resources_busy[instr.computeResource]
+            unit[0] = instr
+            unit[1] = self.calculateNoComputeCycles(instr) -1
+            self.units_busy += 1
         
         return
     
     def calculateNoMemoryCycles(self,instr):
         
-        # calculate number of cycles to be taken in memory by simulating it
-        # creating the queues for each lane:
-        
-        vls_pipelines = [[] for i in range(self.config.parameters["numLanes"])]
-        # assigning each memory access to a queue
-
-        for i in range(instr.vectorLength):
-            if instr.vmem_ad[i] == -1: continue
-            else: 
-                index = instr.vmem_ad[i] % self.config.parameters["numLanes"]
-                vls_pipelines[index].append(instr.vmem_ad[i])
-        
-        # now we simulate all the memory accesses, and calculate the number of cycles to execute this instruction
-        # to calculate which bank it should access, we mod the address by the number of banks
-
-        cycleCount = self.config.parameters["vlsPipelineDepth"] - 1
-        while True:
-
-            # setting checks for if we have finished processing all memory addresses:
-            all_lanes_free = True
-            all_banks_free = True
-            
-            # checking banks; if bank is busy, check countdown. If it is zero, set to bank free. If nonzero, decrement by 1
-            for each_bank in self.banks_busy:
-                if each_bank[0] == True:
-                    all_banks_free = False
-                    if each_bank[1] == 0: each_bank[0] = False
-                    else: each_bank[1] -= 1
-
-            # checking each lane; now we will process each lane in order, automatically giving priority to the lower index
-            for each_lane in vls_pipelines:
-                if len(each_lane) > 0:
-                    all_lanes_free = False
-
-                    mem_addr = int(each_lane[0]) # let's look at the head of the queue and check which bank we should send the address to:
-                    bank_idx = mem_addr % self.config.parameters["vdmNumBanks"]
-
-                    # let's check that bank: if it isn't busy, we dispatch our request. else, do nothing.
-                    if self.banks_busy[bank_idx][0] == False:
-                        each_lane.pop(0)
-                        self.banks_busy[bank_idx][0] = True
-                        self.banks_busy[bank_idx][1] = self.config.parameters["vdmBankBusyTime"]
-
-            if all_lanes_free and all_banks_free: return cycleCount # termination condition
-
-            # incrementing cycle count
-            cycleCount += 1
+        # calculate number of cycles to be taken in memory. Constant stride accesses
+        # without masked off elements (LV/SV, LVWS/SVWS, and LVI/SVI whose indices
+        # happen to be evenly spaced) are mostly solved in closed form (see strided_timing)
+        params = self.config.parameters
+        memory = (params["numLanes"], params["vdmNumBanks"], params["vlsPipelineDepth"], params["vdmBankBusyTime"])
+        vmem_ad = instr.vmem_ad[:instr.vectorLength]
+        cycleCount = None
+        if not any(each_bank[0] for each_bank in self.banks_busy) and -1 not in vmem_ad:
+            count = len(vmem_ad)
+            base = vmem_ad[0] if count else 0
+            stride = vmem_ad[1] - base if count > 1 else 1
+            if vmem_ad.count(base) == count if stride == 0 else \
+               list(vmem_ad) == list(range(base, base + count * stride, stride)):
+                cycleCount = strided_timing(base, stride, count, *memory)
+                if cycleCount is not None and self.check_memory_timing:
+                    simulated = simulate_banks(tuple(vmem_ad), (-1,) * len(self.banks_busy), *memory)[0]
+                    if simulated != cycleCount:
+                        print("Core - ERROR: closed form memory timing of", cycleCount, "cycles differs from the simulated",
+                              simulated, "for", count, "elements from", base, "with stride", stride)
+                        cycleCount = simulated
+        if cycleCount is not None:
+            return cycleCount # the banks are all free again, as they were before
+
+        # otherwise simulate it (see simulate_banks); only the lane and bank of each address
+        # matter, so addresses are reduced modulo lcm(numLanes, vdmNumBanks) and repeated
+        # access shapes hit the cache
+        period = math.lcm(params["numLanes"], params["vdmNumBanks"])
+        addrs = tuple(addr % period for addr in vmem_ad if addr != -1)
+        state = tuple(each_bank[1] if each_bank[0] else -1 for each_bank in self.banks_busy)
+
+        cycleCount, state = bank_timing(addrs, state, *memory)
+        for each_bank, count in zip(self.banks_busy, state):
+            each_bank[0], each_bank[1] = count >= 0, max(count, 0)
+        return cycleCount
             
     def memory(self):
         # decrement all counters if not zero
@@ -436,59 +485,80 @@ class Core():
         #else: # decrement the countdown
         # update busyboard too 
         
-        if self.resources_busy["Memory"][0] is not None and self.resources_busy["Memory"][1] > 0:
-            self.resources_busy["Memory"][1] -= 1
-        elif self.resources_busy["Memory"][0] is not None and self.resources_busy["Memory"][1] <= 0:
-            
-            for reg in self.resources_busy["Memory"][0].src_regs["Scalar"]:
-                self.busyBoard["scalar"][reg] = False
-            for reg in self.resources_busy["Memory"][0].src_regs["Vector"]:
-                self.busyBoard["vector"][reg] = False
-            for reg in self.resources_busy["Memory"][0].dst_regs["Scalar"]:
-                self.busyBoard["scalar"][reg] = False
-            for reg in self.resources_busy["Memory"][0].dst_regs["Vector"]:
-                self.busyBoard["vector"][reg] = False
-            
-            
-            self.resources_busy["Memory"][0] = None
-            self.resources_busy["Memory"][1] = 0
+        unit = self.resources_busy["Memory"]
+        if unit[0] is not None and unit[1] > 0:
+            unit[1] -= 1
+        elif unit[0] is not None and unit[1] <= 0:
+            self.release(unit[0])
+            unit[0] = None
+            unit[1] = 0
+            self.units_busy -= 1
         else:
             if self.instrToBeExecuted[1] is not None:
                 instr = self.instrToBeExecuted[1]
-                self.resources_busy["Memory"][0] = instr
-                self.resources_busy["Memory"][1] = self.calculateNoMemoryCycles(instr) -1 # -1 to prevent a 2 cycle lag
-                
-                for reg in instr.src_regs["Scalar"]:
-                    self.busyBoard["scalar"][reg] = True
-                for reg in instr.src_regs["Vector"]:
-                    self.busyBoard["vector"][reg] = True
-                for reg in instr.dst_regs["Scalar"]:
-                    self.busyBoard["scalar"][reg] = True
-                for reg in instr.dst_regs["Vector"]:
-                    self.busyBoard["vector"][reg] = True
+                unit[0] = instr
+                unit[1] = self.calculateNoMemoryCycles(instr) -1 # -1 to prevent a 2 cycle lag
+                self.units_busy += 1
+                self.busy_scalar |= instr.scalar_regs
+                self.busy_vector |= instr.vector_regs
         
         return
     
     def scalar(self):
 
         if self.instrToBeExecuted[2] is not None:
-            instr = self.instrToBeExecuted[2]
-
-            for reg in instr.src_regs["Scalar"]:
-                self.busyBoard["scalar"][reg] = False
-            for reg in instr.src_regs["Vector"]:
-                self.busyBoard["vector"][reg] = False
-            for reg in instr.dst_regs["Scalar"]:
-                self.busyBoard["scalar"][reg] = False
-            for reg in instr.dst_regs["Vector"]:
-                self.busyBoard["vector"][reg] = False
+            self.release(self.instrToBeExecuted[2])
         
         return
 
         
+    def fetch(self):
+        """
+        Function to read the next trace record. ROI records only carry the VLR
+        and VMR at the start of a region of interest; they are applied here
+        and take no cycle.
+        Returns : trace record, or -1 at the end of the trace
+        """
+        record = self.IMEM.Read(self.PC)
+        while record != -1 and record[0] == ROI_OP:
+            self.VLR = record[4]
+            self.VMR = record[6]
+            self.PC = self.PC + 1
+            record = self.IMEM.Read(self.PC)
+        if record != -1: self.PC = self.PC + 1
+        return record
+
+    def idle_cycles(self):
+        """
+        Function to count the cycles ahead in which nothing can happen but the
+        countdowns of the busy units: nothing was handed to a unit this cycle,
+        decode is stalled, and no busy unit finishes before that many cycles.
+        The queues, busyboard and decode stall then stay as they are, so run()
+        can skip those cycles without changing the cycle count.
+        Returns : number of cycles that can be skipped, 0 if the next one has work
+        """
+        if not self.nop["Fetch"] or self.instrToBeExecuted != [None, None, None]: return 0
+        countdowns = [busy[1] for busy in self.resources_busy.values() if busy[0] is not None]
+        if not countdowns: return 0
+        return max(min(countdowns), 0)
+
+    def enable_watchdog(self, max_instructions = None, max_cycles = None, max_seconds = None, interval = None):
+        # Stop the following runs after max_instructions trace records, max_cycles
+        # cycles or max_seconds of wall time, and print the speed every interval seconds
+        self.watchdog = Watchdog.Watchdog("Timing", max_instructions, max_cycles, max_seconds, interval)
+
     def run(self):
+        """
+        Function to simulate the trace cycle by cycle, jumping over idle
+        cycles (see idle_cycles()) unless self.skip_idle is off
+        Returns : cycle count, or None if the trace ended without HALT or the
+                  watchdog stopped the run; self.CycleCount then holds the
+                  cycles simulated so far
+        """
         self.PC = 0
         self.CycleCount = 0
+        watchdog = self.watchdog
+        if watchdog is not None: watchdog.start()
 
         while(True):
             
@@ -503,43 +573,57 @@ class Core():
             # This instructions dispatches those instructions to their respective resources
             self.instrToBeExecuted = self.sendToResources(queue_status)
 
-            # Decode and SendToQueue
-            if len(self.decode_input)>0:
-                self.instrToBeQueued = self.decode(self.decode_input)
-                if self.instrToBeQueued == -1: break
+            # Decode and SendToQueue; a record is decoded once and waits decoded while stalled
+            if self.decode_input is not None:
+                if self.instrToBeQueued is None: self.instrToBeQueued = self.decode(self.decode_input)
                 addToQueue = self.CheckQueue(self.instrToBeQueued) # checks busyboard and if queues are full
                 # This bool check allows us to stall the fetch and decode if the 
                 # queues are full or there is a data dependency
                 if addToQueue:
                     self.sendToQueue(self.instrToBeQueued)
+                    self.instrToBeQueued = None
                     self.nop["Fetch"] = False
                 else: # set NOPS
                     self.nop["Fetch"] = True
 
             # Fetch: we stall if decode needs to stall
             if not self.nop["Fetch"]:
-                self.decode_input = self.IMEM.Read(self.PC)
+                self.decode_input = self.fetch()
                 if self.decode_input == -1: break
-                self.PC = self.PC + 1
 
             self.CycleCount+=1
 
-            endCondition = True
-            for resource in self.resources_busy:
-                if self.resources_busy[resource][0] is not None: endCondition = False
-            for queue in self.queues:
-                if len(self.queues[queue])>0: endCondition = False
-            if len(self.decode_input) > 0 and self.decode_input != ["HALT"]: endCondition = False
-            for elem in self.busyBoard["scalar"]: 
-                if elem == True: endCondition = False
-            for elem in self.busyBoard["vector"]: 
-                if elem == True: endCondition = False
-            if endCondition == True: return self.CycleCount
+            endCondition = (self.units_busy == 0 and self.queued == 0 and self.busy_scalar == 0 and self.busy_vector == 0
+                            and (self.decode_input is None or self.decode_input[0] == HALT_OP))
+            if endCondition == True:
+                if watchdog is not None: watchdog.finish(self.PC, self.CycleCount)
+                return self.CycleCount
+            if watchdog is not None and watchdog.check(self.PC, self.CycleCount): break
+
+            if self.skip_idle:
+                skip = self.idle_cycles()
+                if watchdog is not None and watchdog.max_cycles is not None:
+                    skip = min(skip, watchdog.max_cycles - self.CycleCount)
+                if skip > 0:
+                    for busy in self.resources_busy.values():
+                        if busy[0] is not None: busy[1] -= skip
+                    self.CycleCount += skip
+                    if watchdog is not None and watchdog.check(self.PC, self.CycleCount): break
+
+        if watchdog is not None: watchdog.finish(self.PC, self.CycleCount)
 
 if __name__ == "__main__": 
     #parse arguments for input file location
     parser = argparse.ArgumentParser(description='Vector Core Timing Simulator')
     parser.add_argument('--iodir', default="", type=str, help='Path to the folder containing the input files - instructions and data.')
+    parser.add_argument('--traceformat', default="binary", choices=["binary", "text"], help='Read the trace from trace.bin or from the text trace.asm.')
+    parser.add_argument('--max-instructions', default=None, type=int, help='Stop after fetching this many trace records.')
+    parser.add_argument('--max-cycles', default=None, type=int, help='Stop after simulating this many cycles.')
+    parser.add_argument('--max-seconds', default=None, type=float, help='Stop after this many seconds of wall time.')
+    parser.add_argument('--progress', default=None, type=float, help='Print the cycles simulated and cycles/s every N seconds.')
+    parser.add_argument('--memory-cache', default=MEMORY_CACHE_SIZE, type=int, help='Number of vector memory access shapes whose timing is cached (default %d, 0 disables the cache).' % MEMORY_CACHE_SIZE)
+    parser.add_argument('--cycle-by-cycle', action='store_true', help='Step through every cycle instead of jumping over cycles in which only unit countdowns change; gives the same cycle count, for cross-checking.')
+    parser.add_argument('--check-memory-timing', action='store_true', help='Also simulate the constant stride vector memory accesses whose timing is computed in closed form, and report any difference.')
     args = parser.parse_args()
 
     iodir = os.path.abspath(args.iodir)
@@ -549,13 +633,19 @@ if __name__ == "__main__":
     config = Config(iodir)
 
     # Parse IMEM
-    imem = IMEM(iodir)  
+    imem = IMEM(iodir, args.traceformat, config.parameters["MVL"])
 
     # Create Vector Core
+    set_memory_cache_size(args.memory_cache)
     vcore = Core(imem, config)
+    vcore.skip_idle = not args.cycle_by_cycle
+    vcore.check_memory_timing = args.check_memory_timing
+    if any(limit is not None for limit in [args.max_instructions, args.max_cycles, args.max_seconds, args.progress]):
+        vcore.enable_watchdog(args.max_instructions, args.max_cycles, args.max_seconds, args.progress)
 
     # Run Core
     cycles = vcore.run()
+    print("Memory timing cache - hits: {hits}, misses: {misses}, entries: {entries} of {maxsize}".format(**memory_cache_stats()))
     print(cycles)
     print("END")
 
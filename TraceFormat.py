@@ -0,0 +1,398 @@
+import sys
+import struct
+import argparse
+from array import array
+
+# Dynamic instruction trace shared by the functional and timing simulators.
+#
+# Every executed instruction is a record tuple:
+#   (opcode id, reg0, reg1, reg2, VLR, value, payload)
+# value   : VLR written by MTCL/MFCL, SDMEM address of LS/SS, target of B
+# payload : array('i') of element addresses (-1 when masked off) for vector
+#           memory operations, integer bitmask of the new VMR for SVV/SVS
+#           (printed in hex in the text trace), None otherwise
+# ROI records mark the start of a region of interest (ROI_BEGIN in Code.asm)
+# and carry the VLR and VMR bitmask in effect there, as the instructions
+# before it were not traced.
+#
+# Repeated stretches of the trace are kept as loop records:
+#   (LOOP_OP, trip count, body, strides)
+# body holds the records (or nested loops) of the first iteration and strides
+# the amount added per iteration to each of them: to the active element
+# addresses of a vector memory operation, to the address of LS/SS, or, for a
+# nested loop, a tuple with one stride per record of its body.
+#
+# Binary file layout (little-endian):
+#   header  : magic "VTRC", format version (u16), MVL (u16)
+#   records : op (u8), reg0..reg2 (u8), VLR (u16), value (i32)
+#             followed by VLR int32 addresses for vector memory operations,
+#             or ceil(MVL/8) mask bytes for SVV/SVS and ROI
+#   loops   : op LOOP_OP, value = trip count, then the body length (u32) and
+#             every body record followed by its stride (i64, one per record
+#             of a nested loop body)
+
+# Register operands (V: vector, S: scalar) and the extra operand printed in
+# the text trace for every trace opcode
+TRACE_FORMATS = {
+    "ADDVV": ("VVV", None), "SUBVV": ("VVV", None), "MULVV": ("VVV", None), "DIVVV": ("VVV", None),
+    "ADDVS": ("VVS", None), "SUBVS": ("VVS", None), "MULVS": ("VVS", None), "DIVVS": ("VVS", None),
+
+    "SVV": ("VV", "mask"), "SVS": ("VS", "mask"),
+    "CVM": ("", None), "POP": ("S", None),
+
+    "MTCL": ("S", "value"), "MFCL": ("S", "value"),
+
+    "LV": ("V", "addrs"), "SV": ("V", "addrs"), "LVI": ("V", "addrs"),
+    "SVI": ("V", "addrs"), "LVWS": ("V", "addrs"), "SVWS": ("V", "addrs"),
+    "LS": ("S", "value"), "SS": ("S", "value"),
+
+    "ADD": ("SSS", None), "SUB": ("SSS", None), "AND": ("SSS", None), "OR": ("SSS", None),
+    "XOR": ("SSS", None), "SLL": ("SSS", None), "SRL": ("SSS", None), "SRA": ("SSS", None),
+
+    "B": ("", "value"),
+
+    "UNPACKLO": ("VVV", None), "UNPACKHI": ("VVV", None), "PACKLO": ("VVV", None), "PACKHI": ("VVV", None),
+
+    "HALT": ("", None),
+
+    "ROI": ("", "state"),
+}
+TRACE_OPS = list(TRACE_FORMATS)
+TRACE_IDS = {name: idx for idx, name in enumerate(TRACE_OPS)}
+
+LOOP_OP = 255 # op of a loop record; never a real trace opcode
+B_OP = TRACE_IDS["B"]
+ROI_OP = TRACE_IDS["ROI"]
+VALUE_STRIDE_OPS = {TRACE_IDS["LS"], TRACE_IDS["SS"]}
+MAX_PERIOD = 4 # Longest loop body searched for, in branch-terminated segments
+
+# Architectural parameters (set in Config.txt) with the values of the original
+# design, and the largest values the record layout can hold: register numbers
+# are stored in a byte and VLR in a u16
+ARCH_DEFAULTS = {"MVL": 64, "numScalarRegs": 8, "numVectorRegs": 8}
+ARCH_LIMITS = {"MVL": 65535, "numScalarRegs": 256, "numVectorRegs": 256}
+
+MAGIC = b"VTRC"
+VERSION = 2 # 2 adds loop records; version 1 files are still read
+FILE_HEADER = struct.Struct("<4sHH")
+RECORD_HEADER = struct.Struct("<BBBBHi")
+LOOP_LENGTH = struct.Struct("<I")
+STRIDE = struct.Struct("<q")
+
+def check_arch(arch):
+    # Raises ValueError for architectural parameters the trace cannot represent
+    for name, limit in ARCH_LIMITS.items():
+        if not 0 < arch[name] <= limit:
+            raise ValueError("%s must be between 1 and %d, not %d" % (name, limit, arch[name]))
+
+def mask_bits(mask):
+    # Integer bitmask with bit i set when element i of the 0/1 mask is 1
+    return sum([1 << i for i, bit in enumerate(mask) if bit == 1])
+
+def mask_text(mask, MVL):
+    # Bitmask in the text trace: hex, one digit per 4 elements, element 0 in the lowest bit
+    return "(0x%0*x)" % ((MVL + 3) // 4, mask)
+
+def parse_mask(token):
+    # Bitmask of a text trace mask operand; older traces list one 0/1 value per element
+    items = token[1:-1]
+    if items.startswith("0x"): return int(items, 16)
+    return mask_bits([int(ele) for ele in items.split(",")])
+
+def render(record, MVL = 64):
+    """
+    Function to print a record in the text trace format (trace.asm)
+    Returns : string : one line of the text trace, without the newline
+    """
+    op, r0, r1, r2, vlr, value, payload = record
+    name = TRACE_OPS[op]
+    regs, extra = TRACE_FORMATS[name]
+    fields = [name] + [("VR" if kind == "V" else "SR") + str(reg) for kind, reg in zip(regs, (r0, r1, r2))]
+
+    if extra == "value":
+        fields.append("(" + str(value) + ")")
+    elif extra == "addrs":
+        fields.append("(" + ",".join(map(str, payload)) + ")")
+    elif extra == "mask":
+        fields.append(mask_text(payload, MVL))
+    elif extra == "state":
+        fields.append("(" + str(vlr) + ")")
+        fields.append(mask_text(payload, MVL))
+
+    return " ".join(fields)
+
+def parse(line, VLR = 64):
+    """
+    Function to convert one line of a text trace back into a record
+    The text trace does not print the vector length of register-register
+    vector operations, so the caller passes the VLR in effect.
+    Returns : tuple : trace record, or None for blank and comment lines
+    """
+    tokens = line.split('#')[0].split()
+    if not tokens: return None
+    if tokens[0] not in TRACE_IDS:
+        raise ValueError("Unknown instruction in trace: " + line.strip())
+
+    regs, extra = TRACE_FORMATS[tokens[0]]
+    reg_vals = [int(tok[2:]) for tok in tokens[1:len(regs)+1]] + [0] * (3 - len(regs))
+    vlr, value, payload = (VLR if "V" in regs else 0), 0, None
+    if extra == "mask":
+        payload = parse_mask(tokens[len(regs)+1])
+    elif extra is not None:
+        items = [int(ele) for ele in tokens[len(regs)+1][1:-1].split(",")]
+        if extra == "value": value = items[0]
+        elif extra == "addrs": payload = array('i', items); vlr = len(items)
+        elif extra == "state":
+            vlr = items[0]
+            payload = parse_mask(tokens[len(regs)+2])
+
+    return (TRACE_IDS[tokens[0]], reg_vals[0], reg_vals[1], reg_vals[2], vlr, value, payload)
+
+def shift(item, stride, k):
+    """
+    Function to compute iteration k of a loop body item
+    Args    : item   : record or loop record of the first iteration
+              stride : its per-iteration stride
+    Returns : the record or loop record as it appears in iteration k
+    """
+    if k == 0: return item
+    if item[0] == LOOP_OP:
+        op, trips, body, strides = item
+        return (op, trips, [shift(sub, s, k) for sub, s in zip(body, stride)], strides)
+    if stride == 0: return item
+
+    op, r0, r1, r2, vlr, value, payload = item
+    if op in VALUE_STRIDE_OPS: return (op, r0, r1, r2, vlr, value + stride*k, payload)
+    step = stride*k
+    return (op, r0, r1, r2, vlr, value, array('i', [addr if addr == -1 else addr + step for addr in payload]))
+
+def delta(a, b):
+    """
+    Function to find the stride that turns item a into item b
+    Returns : int, tuple for loop records, or None if b is not a shifted copy of a
+    """
+    if a[0] != b[0]: return None
+    if a[0] == LOOP_OP:
+        if a[1] != b[1] or a[3] != b[3]: return None
+        return group_delta(a[2], b[2])
+
+    if a[1:6] == b[1:6] and a[6] == b[6]: return 0
+    if a[1:5] != b[1:5]: return None
+    if a[0] in VALUE_STRIDE_OPS: return b[5] - a[5]
+    if a[5] != b[5] or not isinstance(a[6], array): return None
+
+    # Active addresses must all move by the same amount; masked (-1) ones stay put
+    stride = None
+    for x, y in zip(a[6], b[6]):
+        if x == -1 or y == -1:
+            if x != y: return None
+        elif stride is None: stride = y - x
+        elif y - x != stride: return None
+    return stride
+
+def group_delta(a, b):
+    # Strides of the items of two equally long stretches, or None
+    if len(a) != len(b): return None
+    strides = []
+    for x, y in zip(a, b):
+        stride = delta(x, y)
+        if stride is None: return None
+        strides.append(stride)
+    return tuple(strides)
+
+def compress_pass(items, max_period = MAX_PERIOD):
+    # Cut the trace after every branch; a loop is a run of 1..max_period such
+    # segments that repeats with constant strides
+    segments, seg = [], []
+    for item in items:
+        seg.append(item)
+        if item[0] == B_OP:
+            segments.append(seg)
+            seg = []
+    if seg: segments.append(seg)
+
+    def group(i, q): return [item for seg in segments[i:i+q] for item in seg]
+
+    out = []
+    i = 0
+    while i < len(segments):
+        best = None # (segments covered, period, trip count, body, strides)
+        for q in range(1, max_period + 1):
+            if i + 2*q > len(segments): break
+            # A multiple of a period that already repeats cannot cover more
+            if best is not None and q % best[1] == 0: continue
+            body = group(i, q)
+            prev = group(i + q, q)
+            strides = group_delta(body, prev)
+            if strides is None: continue
+            trips = 2
+            while i + (trips+1)*q <= len(segments):
+                cur = group(i + trips*q, q)
+                if group_delta(prev, cur) != strides: break
+                prev = cur
+                trips += 1
+            if best is None or trips*q > best[0]: best = (trips*q, q, trips, body, strides)
+
+        if best is None:
+            out += segments[i]
+            i += 1
+        else:
+            covered, q, trips, body, strides = best
+            out.append((LOOP_OP, trips, body, strides))
+            i += covered
+    return out
+
+def compress(records):
+    """
+    Function to fold repeated stretches of a trace into (nested) loop records
+    Returns : list of records and loop records; expand() gives back the input
+    """
+    items = list(records)
+    while True:
+        folded = compress_pass(items)
+        if len(folded) == len(items): return items
+        items = folded
+
+def expand(records):
+    """
+    Function to unroll loop records
+    Returns : generator of plain trace records
+    """
+    for item in records:
+        if item[0] != LOOP_OP:
+            yield item
+            continue
+        op, trips, body, strides = item
+        for k in range(trips):
+            yield from expand([shift(sub, stride, k) for sub, stride in zip(body, strides)])
+
+def pack_record(buf, item, mask_bytes):
+    if item[0] == LOOP_OP:
+        op, trips, body, strides = item
+        buf += RECORD_HEADER.pack(LOOP_OP, 0, 0, 0, 0, trips)
+        buf += LOOP_LENGTH.pack(len(body))
+        for sub, stride in zip(body, strides):
+            pack_record(buf, sub, mask_bytes)
+            pack_stride(buf, sub, stride)
+        return
+
+    op, r0, r1, r2, vlr, value, payload = item
+    buf += RECORD_HEADER.pack(op, r0, r1, r2, vlr, value)
+    if payload is None: return
+    if isinstance(payload, int):
+        buf += payload.to_bytes(mask_bytes, 'little')
+    else:
+        if sys.byteorder == 'big':
+            payload = array('i', payload)
+            payload.byteswap()
+        buf += payload.tobytes()
+
+def pack_stride(buf, item, stride):
+    if item[0] == LOOP_OP:
+        for sub, s in zip(item[2], stride): pack_stride(buf, sub, s)
+    else:
+        buf += STRIDE.pack(stride)
+
+def write_binary(path, records, MVL = 64, loops = True):
+    # loops: fold repeated stretches into loop records before writing
+    mask_bytes = (MVL + 7) // 8
+    if loops: records = compress(records)
+    with open(path, 'wb') as opf:
+        opf.write(FILE_HEADER.pack(MAGIC, VERSION, MVL))
+        buf = bytearray()
+        for item in records:
+            pack_record(buf, item, mask_bytes)
+            if len(buf) > (1 << 20):
+                opf.write(buf)
+                buf = bytearray()
+        opf.write(buf)
+
+ADDR_OPS = {TRACE_IDS[name] for name in TRACE_OPS if TRACE_FORMATS[name][1] == "addrs"}
+MASK_OPS = {TRACE_IDS[name] for name in TRACE_OPS if TRACE_FORMATS[name][1] in ("mask", "state")}
+
+def unpack_record(data, offset, mask_bytes):
+    # Returns the record or loop record at offset and the offset past it
+    op, r0, r1, r2, vlr, value = RECORD_HEADER.unpack_from(data, offset)
+    offset += RECORD_HEADER.size
+
+    if op == LOOP_OP:
+        count, = LOOP_LENGTH.unpack_from(data, offset)
+        offset += LOOP_LENGTH.size
+        body, strides = [], []
+        for _ in range(count):
+            sub, offset = unpack_record(data, offset, mask_bytes)
+            stride, offset = unpack_stride(data, offset, sub)
+            body.append(sub)
+            strides.append(stride)
+        return (LOOP_OP, value, body, tuple(strides)), offset
+
+    payload = None
+    if op in ADDR_OPS:
+        payload = array('i', data[offset:offset + 4*vlr])
+        if sys.byteorder == 'big': payload.byteswap()
+        offset += 4*vlr
+    elif op in MASK_OPS:
+        payload = int.from_bytes(data[offset:offset + mask_bytes], 'little')
+        offset += mask_bytes
+    return (op, r0, r1, r2, vlr, value, payload), offset
+
+def unpack_stride(data, offset, item):
+    if item[0] == LOOP_OP:
+        strides = []
+        for sub in item[2]:
+            stride, offset = unpack_stride(data, offset, sub)
+            strides.append(stride)
+        return tuple(strides), offset
+    return STRIDE.unpack_from(data, offset)[0], offset + STRIDE.size
+
+def read_binary(path):
+    """
+    Function to load a binary trace
+    Returns : tuple : (list of records and loop records, MVL); see expand()
+    """
+    with open(path, 'rb') as ipf:
+        data = ipf.read()
+
+    magic, version, MVL = FILE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError("Not a version %d binary trace: %s" % (VERSION, path))
+
+    mask_bytes = (MVL + 7) // 8
+    records = []
+    offset = FILE_HEADER.size
+    while offset < len(data):
+        record, offset = unpack_record(data, offset, mask_bytes)
+        records.append(record)
+
+    return records, MVL
+
+def write_text(path, records, MVL = 64):
+    with open(path, 'w') as opf:
+        opf.writelines([render(record, MVL) + '\n' for record in expand(records)])
+
+def read_text(path, MVL = 64):
+    records = []
+    VLR = MVL
+    with open(path, 'r') as ipf:
+        for line in ipf.readlines():
+            record = parse(line, VLR)
+            if record is None: continue
+            if record[0] == TRACE_IDS["MTCL"]: VLR = record[5]
+            elif record[0] == ROI_OP: VLR = record[4]
+            records.append(record)
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert instruction traces between the binary and text formats')
+    parser.add_argument('src', type=str, help='Input trace; .asm for text, anything else is read as a binary trace.')
+    parser.add_argument('dst', type=str, help='Output trace; .asm for text, anything else is written as a binary trace.')
+    parser.add_argument('--mvl', default=64, type=int, help='Maximum vector length used when reading a text trace.')
+    parser.add_argument('--no-loops', action='store_true', help='Write a binary trace without loop records.')
+    args = parser.parse_args()
+
+    if args.src.endswith(".asm"): records, MVL = read_text(args.src, args.mvl), args.mvl
+    else: records, MVL = read_binary(args.src)
+
+    if args.dst.endswith(".asm"): write_text(args.dst, records, MVL)
+    else: write_binary(args.dst, list(expand(records)), MVL, not args.no_loops)
+    print("Converted", len(records), "trace records from", args.src, "to", args.dst)
@@ -0,0 +1,82 @@
+import time
+
+# Budgets and a throughput meter for simulator runs. A run stops cleanly once
+# it has executed max_instructions instructions, simulated max_cycles cycles or
+# spent max_seconds of wall time, and every `interval` seconds a progress line
+# reports the instructions/s and cycles/s of the last interval.
+
+STRIDE = 1 << 14 # instructions (or cycles) between two looks at the clock
+
+class Watchdog(object):
+    def __init__(self, name, max_instructions = None, max_cycles = None, max_seconds = None, interval = None):
+        # name : prefix of the printed lines, e.g. "Core"
+        self.name = name
+        self.max_instructions = max_instructions
+        self.max_cycles = max_cycles
+        self.max_seconds = max_seconds
+        self.interval = interval
+        self.start()
+
+    def start(self):
+        # Called by the core when a run begins
+        self.reason = None # why the run stopped early, None while within the budgets
+        self.started = self.reported = time.perf_counter()
+        self.last = (0, 0)
+        self.clock_due = STRIDE if self.interval is not None or self.max_seconds is not None else None
+        self.instructions = self.cycles = 0
+        self.elapsed = 0.0
+
+    def next_check(self, instructions):
+        # Instruction count at which an instruction driven loop has to call
+        # check() again, -1 for never
+        due = []
+        if self.max_instructions is not None: due.append(max(self.max_instructions, instructions))
+        if self.clock_due is not None: due.append(max(self.clock_due, instructions))
+        return min(due) if due else -1
+
+    def check(self, instructions, cycles = 0):
+        """
+        Function to enforce the budgets and print a progress line once the
+        interval has passed
+        Returns : True when the run has to stop, see self.reason
+        """
+        if self.max_instructions is not None and instructions >= self.max_instructions:
+            self.reason = "instruction budget of %d exhausted" % self.max_instructions
+        elif self.max_cycles is not None and cycles >= self.max_cycles:
+            self.reason = "cycle budget of %d exhausted" % self.max_cycles
+        elif self.clock_due is not None and instructions + cycles >= self.clock_due:
+            self.clock_due = instructions + cycles + STRIDE
+            now = time.perf_counter()
+            if self.max_seconds is not None and now - self.started >= self.max_seconds:
+                self.reason = "time limit of %g s exceeded" % self.max_seconds
+            elif self.interval is not None and now - self.reported >= self.interval:
+                self.progress(now, instructions, cycles)
+        return self.reason is not None
+
+    def counts(self, instructions, cycles):
+        return "%d instructions" % instructions + (", %d cycles" % cycles if cycles else "")
+
+    def rates(self, seconds, instructions, cycles):
+        seconds = max(seconds, 1e-9)
+        return "%.0f instr/s" % (instructions / seconds) + (", %.0f cycles/s" % (cycles / seconds) if cycles else "")
+
+    def progress(self, now, instructions, cycles):
+        # Rates over the last interval, i.e. the current simulation speed
+        print(self.name, "- progress:", self.counts(instructions, cycles), "|",
+              self.rates(now - self.reported, instructions - self.last[0], cycles - self.last[1]), flush = True)
+        self.reported = now
+        self.last = (instructions, cycles)
+
+    def finish(self, instructions, cycles = 0):
+        """
+        Function to record and print the statistics of the run that just
+        ended, complete or not
+        Returns : True if a budget stopped the run early
+        """
+        self.instructions, self.cycles = instructions, cycles
+        self.elapsed = time.perf_counter() - self.started
+        summary = "%s in %.2f s (%s)" % (self.counts(instructions, cycles), self.elapsed,
+                                         self.rates(self.elapsed, instructions, cycles))
+        if self.reason is not None: print(self.name, "- STOPPED:", self.reason, "after", summary)
+        else: print(self.name, "- ran", summary)
+        return self.reason is not None
@@ -1,7 +1,7 @@
 import os
 import argparse
 
-from FunctionalSimulator import IMEM_func, DMEM_func, Core_func
+from FunctionalSimulator import IMEM_func, DMEM_func, Core_func, load_arch
 from TimingSimulator import Config, Core, IMEM #DMEM
 
 parser = argparse.ArgumentParser(description='Vector Core Performance Model')
@@ -13,20 +13,22 @@ print("IO Directory:", iodir)
 print("------------------------------------------------")
 print("Starting Functional Simulator")
 # Parse IMEM
-imem = IMEM_func(iodir)  
+arch = load_arch(iodir)
+imem = IMEM_func(iodir, arch)
+if imem.errors: raise SystemExit(1)
 # Parse SMEM
 sdmem = DMEM_func("SDMEM", iodir, 13) # 32 KB is 2^15 bytes = 2^13 K 32-bit words.
 # Parse VMEM
 vdmem = DMEM_func("VDMEM", iodir, 17) # 512 KB is 2^19 bytes = 2^17 K 32-bit words. 
 
 # Create Vector Core
-vcore = Core_func(imem, sdmem, vdmem)
+vcore = Core_func(imem, sdmem, vdmem, arch)
 
 # Run Core
 vcore.run()   
 vcore.dumpregs(iodir)
 
-imem.Dump()
+imem.Dump(MVL = vcore.MVL)
 sdmem.dump()
 vdmem.dump()
 
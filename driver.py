@@ -1,48 +1,125 @@
 import os
 import argparse
 
-from FunctionalSimulator import IMEM_func, DMEM_func, Core_func
-from TimingSimulator import Config, Core, IMEM #DMEM
+from FunctionalSimulator import IMEM_func, DMEM_func, ENGINES, load_arch, DUMP_MODES, FLAT_ADDRESS_LEN, MAX_ADDRESS_LEN
+from TimingSimulator import Config, Core, IMEM, IMEM_stream, MEMORY_CACHE_SIZE, set_memory_cache_size, memory_cache_stats #DMEM
 
 parser = argparse.ArgumentParser(description='Vector Core Performance Model')
 parser.add_argument('--iodir', default="", type=str, help='Path to the folder containing the input files - instructions and data.')
+parser.add_argument('--engine', default="list", choices=ENGINES, help='Functional core implementation: pure Python lists, NumPy arrays or compiled basic blocks.')
+parser.add_argument('--memformat', default="text", choices=["text", "binary", "sparse"], help='Format of the SDMEM/VDMEM files: text, or binary int32 images (.bin) that are memory mapped, or sparse address:value text files.')
+parser.add_argument('--dump', default="full", choices=DUMP_MODES, help='Write the whole data memories (full), every word of the pages the program wrote (modified) or only the words that changed (diff); modified and diff write address:value text files.')
+parser.add_argument('--sdmem-bits', default=13, type=int, help='SDMEM holds 2^N words (default 13, at most %d).' % MAX_ADDRESS_LEN)
+parser.add_argument('--vdmem-bits', default=17, type=int, help='VDMEM holds 2^N words (default 17, at most %d). Memories above 2^%d words are paged.' % (MAX_ADDRESS_LEN, FLAT_ADDRESS_LEN))
+parser.add_argument('--paged', action='store_true', help='Allocate the data memories page by page as they are written, whatever their size.')
+parser.add_argument('--trace-text', action='store_true', help='Also write the human readable trace.asm next to the binary trace.bin.')
+parser.add_argument('--stream', action='store_true', help='Co-simulate: feed instructions from the functional core straight into the timing core without writing a trace file.')
+parser.add_argument('--profile', action='store_true', help='Write per line execution counts of Code.asm (profile.txt) and a JSON summary (profile.json).')
+parser.add_argument('--counters', action='store_true', help='Write performance counters of the functional run (instruction classes, active and masked elements, memory words, branch outcomes, VLR distribution) to counters.json.')
+parser.add_argument('--restore', default=None, type=str, help='Resume the functional simulator from a checkpoint (see FunctionalSimulator.py --checkpoint) and time only the rest of the program.')
+parser.add_argument('--max-instructions', default=None, type=int, help='Stop the functional simulator after executing this many instructions; the timing simulator is then skipped as the trace is incomplete.')
+parser.add_argument('--memory-cache', default=MEMORY_CACHE_SIZE, type=int, help='Number of vector memory access shapes whose timing the timing simulator caches (default %d, 0 disables the cache).' % MEMORY_CACHE_SIZE)
+parser.add_argument('--cycle-by-cycle', action='store_true', help='Let the timing simulator step through every cycle instead of jumping over cycles in which only unit countdowns change; same cycle count, for cross-checking.')
+parser.add_argument('--check-memory-timing', action='store_true', help='Let the timing simulator also simulate the constant stride vector memory accesses it times in closed form, and report any difference.')
+parser.add_argument('--max-cycles', default=None, type=int, help='Stop the timing simulator after simulating this many cycles.')
+parser.add_argument('--max-seconds', default=None, type=float, help='Stop each simulator after this many seconds of wall time.')
+parser.add_argument('--progress', default=None, type=float, help='Print instructions/s and cycles/s every N seconds.')
 args = parser.parse_args()
+for bits in [args.sdmem_bits, args.vdmem_bits]:
+    if not 0 < bits <= MAX_ADDRESS_LEN: parser.error("memory address widths must be between 1 and %d bits" % MAX_ADDRESS_LEN)
 
 iodir = os.path.abspath(args.iodir)
 print("IO Directory:", iodir)
 print("------------------------------------------------")
 print("Starting Functional Simulator")
 # Parse IMEM
-imem = IMEM_func(iodir)  
+arch = load_arch(iodir)
+imem = IMEM_func(iodir, arch)
+if imem.errors: raise SystemExit(1)
 # Parse SMEM
-sdmem = DMEM_func("SDMEM", iodir, 13) # 32 KB is 2^15 bytes = 2^13 K 32-bit words.
+sdmem = DMEM_func("SDMEM", iodir, args.sdmem_bits, args.memformat, args.paged or None) # 32 KB is 2^15 bytes = 2^13 K 32-bit words by default.
 # Parse VMEM
-vdmem = DMEM_func("VDMEM", iodir, 17) # 512 KB is 2^19 bytes = 2^17 K 32-bit words. 
+vdmem = DMEM_func("VDMEM", iodir, args.vdmem_bits, args.memformat, args.paged or None) # 512 KB is 2^19 bytes = 2^17 K 32-bit words by default.
 
 # Create Vector Core
-vcore = Core_func(imem, sdmem, vdmem)
+vcore = ENGINES[args.engine](imem, sdmem, vdmem, arch)
 
-# Run Core
-vcore.run()   
-vcore.dumpregs(iodir)
+start = 0
+if args.restore is not None:
+    if vcore.restore(args.restore) == -1: raise SystemExit(1)
+    start = vcore.PC
+if args.profile: vcore.enable_profile()
+if args.counters: vcore.enable_counters()
+if args.max_instructions is not None or args.max_seconds is not None or args.progress is not None:
+    vcore.enable_watchdog(args.max_instructions, args.max_seconds, args.progress)
 
-imem.Dump()
-sdmem.dump()
-vdmem.dump()
+def watch(tcore):
+    # Cycle skipping, memory timing (cache, closed form cross-check), cycle budget, time limit and progress reports of the timing core
+    tcore.skip_idle = not args.cycle_by_cycle
+    tcore.check_memory_timing = args.check_memory_timing
+    set_memory_cache_size(args.memory_cache)
+    if args.max_cycles is not None or args.max_seconds is not None or args.progress is not None:
+        tcore.enable_watchdog(None, args.max_cycles, args.max_seconds, args.progress)
 
-print("\n Functional simulation complete; generated trace")
+def resume_state(tcore):
+    # The timing core tracks VLR and VMR from the trace; seed them with the restored values
+    if args.restore is not None:
+        tcore.VLR = int(vcore.VLR.Read(0)[0])
+        tcore.VMR = vcore.mask_bits()
 
-print("------------------------------------------")
-print("Starting Timing Simulator")
+if args.stream:
+    print("Streaming the functional simulator into the Timing Simulator")
 
-# Parse Config
-config = Config(iodir)
-imem = IMEM(iodir)  
+    # Parse Config
+    config = Config(iodir)
+    trace = vcore.stream(start)
+    tcore = Core(IMEM_stream(trace), config)
+    resume_state(tcore)
+    watch(tcore)
+    cycles = tcore.run()
+    trace.close() # the timing core may have stopped before the end of the trace
 
+    # The timing core stops fetching at HALT, so the functional state is final here
+    vcore.dumpregs(iodir)
+    if args.profile: vcore.profile.dump(iodir, imem.instructions)
+    if args.counters: vcore.counters.dump(iodir)
+    sdmem.dump(args.dump)
+    vdmem.dump(args.dump)
 
-vcore = Core(imem, config)
-cycles = vcore.run()
+    print("\nCo-simulation complete")
+    print("Memory timing cache - hits: {hits}, misses: {misses}, entries: {entries} of {maxsize}".format(**memory_cache_stats()))
+    print("Total Cycles taken:",cycles)
+
+else:
+    # Run Core
+    vcore.run(start)
+    vcore.dumpregs(iodir)
+    if args.profile: vcore.profile.dump(iodir, imem.instructions)
+    if args.counters: vcore.counters.dump(iodir)
+
+    imem.Dump(args.trace_text, vcore.MVL)
+    sdmem.dump(args.dump)
+    vdmem.dump(args.dump)
+
+    if vcore.watchdog is not None and vcore.watchdog.reason is not None:
+        print("\nFunctional simulation stopped early; the trace ends without HALT, so it is not timed")
+        raise SystemExit(1)
+    print("\n Functional simulation complete; generated trace")
+
+    print("------------------------------------------")
+    print("Starting Timing Simulator")
+
+    # Parse Config
+    config = Config(iodir)
+    imem = IMEM(iodir)  
+
+
+    tcore = Core(imem, config)
+    resume_state(tcore)
+    watch(tcore)
+    cycles = tcore.run()
     
 
-print("\nTiming Simulator complete")
-print("Total Cycles taken:",cycles)
+    print("\nTiming Simulator complete")
+    print("Memory timing cache - hits: {hits}, misses: {misses}, entries: {entries} of {maxsize}".format(**memory_cache_stats()))
+    print("Total Cycles taken:",cycles)